@@ -5,18 +5,33 @@ import addonHandler
 import gui
 import globalPluginHandler
 import globalVars
+import os
 import threading
 import time
 import wx
 import speech
 import speechDictHandler
-from copy import deepcopy
 from logHandler import log
+# 圧縮した辞書は、変換器を読み込むモジュールより先に展開しておく
+from . import compressedDictionaries
+compressedDictionaries.prepare()
 from .constants import *
 from . import updater
+from . import addressReader
 from . import compatibilityUtil
+from . import converter
+from . import chunkedConversion
+from . import diagnostics
+from . import dictionaryShards
 from . import dictionarySwitcher
-from ._englishToKanaConverter.englishToKanaConverter import EnglishToKanaConverter, ConversionMode
+from . import materializedReadings
+from . import missTracker
+from . import persistentCache
+from . import postProcessor
+from . import prefetcher
+from . import sequenceFilter
+from . import spellOut
+from ._englishToKanaConverter.englishToKanaConverter import ConversionMode
 from scriptHandler import script
 
 try:
@@ -31,7 +46,16 @@ confspec = {
 	"enable": "boolean(default=True)",
 	"accessToken": 'string(default="")',
 	"forceSpellOut": "boolean(default=False)",
-	"useDevDictionary": "boolean(default=False)"
+	"useDevDictionary": "boolean(default=False)",
+	"reloadDevDictionary": "boolean(default=False)",
+	"trackMisses": "boolean(default=False)",
+	"useSequenceFilter": "boolean(default=False)",
+	"lowMemoryMode": "boolean(default=False)",
+	"persistentCache": "boolean(default=False)",
+	# URL・メールアドレス・パスを読む文字数の上限。0 なら上限を設けない
+	"maxAddressLength": "integer(default=80, min=0)",
+	# 省メモリモードで読み込んだままにしておく辞書の合計の上限（KB）
+	"lowMemoryLimit": "integer(default=4096, min=256)"
 }
 config.conf.spec["ERE_global"] = confspec
 
@@ -44,63 +68,176 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		if self.getUpdateCheckSetting() is True:
 			self.autoUpdateChecker = updater.AutoUpdateChecker()
 			self.autoUpdateChecker.autoUpdateCheck()
+		addressReader.maxLength = config.conf["ERE_global"]["maxAddressLength"]
+		self._applyLowMemoryMode()
 		self._restoreDictionarySetting()
+		self.devDictionaryWatcher = dictionarySwitcher.DevDictionaryWatcher()
+		if self.getDevDictionaryReloadSetting() and dictionarySwitcher.isAvailable():
+			self.devDictionaryWatcher.start()
+		# 省メモリモードでは、変換済みの読みの表も読み込まない
+		if not self.getLowMemorySetting():
+			materializedReadings.readings.load()
+		self.persistentCache = None
+		if self.getPersistentCacheSetting():
+			self._startPersistentCache()
 		self._setupMenu()
+		self._enabled = False
+		self.builtinDict_original = None
+		self.builtinDict_filtered = None
+		self._install()
 		if self.getStateSetting():
 			self._setup()
 		t = threading.Thread(target=self._checkAutoLanguageSwitchingState, daemon=True)
 		t.start()
 
 	def _checkAutoLanguageSwitchingState(self):
+		# 読み上げの列ごとに変換する場合は、言語の切り替えを正しく扱える
+		if self.getSequenceFilterSetting() and sequenceFilter.isAvailable():
+			return
 		if self.getStateSetting() and config.conf["speech"]["autoLanguageSwitching"]:
 			compatibilityUtil.messageBox(_("Automatic Language switching is enabled. English Reading Enhancer may not work correctly. To use this add-on, we recommend to disable this functionality."), _("Warning"))
 
 	def terminate(self):
 		super(GlobalPlugin, self).terminate()
+		if self._enabled:
+			self._unsetup()
+		self._uninstall()
+		self._stopPersistentCache()
+		self.devDictionaryWatcher.stop()
 		try:
 			gui.mainFrame.sysTrayIcon.menu.Remove(self.rootMenuItem)
 		except BaseException:
 			pass
 
-	def _setup(self):
+	def _install(self):
+		"""変換処理を NVDA に組み込む。有効・無効の切り替えとは関係なく、1回だけ行う。"""
 		if hasattr(speech, "speech"):
 			self.processText_original = speech.speech.processText
 		else:
 			self.processText_original = speech.processText
-		c = EnglishToKanaConverter()
+		self.converter = converter.get()
+		self.prefetcher = prefetcher.Prefetcher()
 
 		def processText(locale, text, symbolLevel, **kwargs):
 			# 2026/01/11 本家のprocessTextよりも前にカナ変換をするように変更
 			# 従来の実装ではアポストロフィーなどの記号が読みに変換されたあとで処理されるため、「haven't」などが正しく読めなかった
-			if locale.startswith("ja") and self.getStateSetting():
-				mode = ConversionMode.SPELL_ALL if self.getForceSpellOutSetting() else ConversionMode.STANDARD
-				text = c.process(text, mode=mode)
+			if self._enabled and locale.startswith("ja"):
+				# 読み上げの列ごとに変換する場合は、sequenceFilter で変換済み
+				if self.sequenceFilter is None:
+					text = self._convert(text)
+				# 変換後の文字列には、組み込みの読み上げ辞書のほとんどの項目が当てはまらない。
+				# 1回の走査で確かめ、当てはまる場合だけ順番に適用する
+				with postProcessor.japanese():
+					return self.processText_original(locale, text, symbolLevel, **kwargs)
 			text = self.processText_original(locale, text, symbolLevel, **kwargs)
 			return text
+		self.sequenceFilter = None
+		if self.getSequenceFilterSetting() and sequenceFilter.isAvailable():
+			# 読み上げの列ごとにまとめて変換する。processText は、組み込みの読み上げ辞書のまとめた走査のためだけに置き換える
+			self.sequenceFilter = sequenceFilter.SequenceFilter(self._convertMany)
+			self.sequenceFilter.register()
 		if hasattr(speech, "speech"):
 			speech.speech.processText = processText
 		else:
 			speech.processText = processText
-		# modify builtin speech dicts
-		unusedEntries = []
-		unusedPatterns = (
-			"([a-z])([A-Z])",
-			"([A-Z])([A-Z][a-z])",
-		)
-		for entry in speechDictHandler.dictionaries["builtin"]:
-			if entry.pattern in unusedPatterns:
-				unusedEntries.append(entry)
-		self.builtinDict_original = deepcopy(speechDictHandler.dictionaries["builtin"])
-		for entry in unusedEntries:
-			index = speechDictHandler.dictionaries["builtin"].index(entry)
-			del speechDictHandler.dictionaries["builtin"][index]
+		chunkedConversion.register()
 
-	def _unsetup(self):
+	def _uninstall(self):
+		if self.sequenceFilter is not None:
+			self.sequenceFilter.unregister()
+			self.sequenceFilter = None
 		if hasattr(speech, "speech"):
 			speech.speech.processText = self.processText_original
 		else:
 			speech.processText = self.processText_original
-		speechDictHandler.dictionaries["builtin"] = self.builtinDict_original
+		chunkedConversion.unregister()
+		self.prefetcher.stop()
+
+	def _setup(self):
+		"""変換を有効にする。組み込み済みの処理を働かせ、組み込みの読み上げ辞書を差し替えるだけで済ませる。"""
+		speechDictHandler.dictionaries["builtin"] = self._getFilteredBuiltinDict()
+		self._enabled = True
+
+	def _unsetup(self):
+		self._enabled = False
+		self.prefetcher.cache.clear()
+		if speechDictHandler.dictionaries["builtin"] is self.builtinDict_filtered:
+			speechDictHandler.dictionaries["builtin"] = self.builtinDict_original
+
+	def _getFilteredBuiltinDict(self):
+		"""組み込みの読み上げ辞書から、不要なパターンを除いたものを返す。
+
+		一度作ったものは控えておき、切り替えのたびに作り直さない。
+		項目は元の辞書と共有するので、複製するのはリストだけで済む。
+		日本語の処理中は、残った項目をまとめて走査する postProcessor.FusedSpeechDict を使う。
+		"""
+		current = speechDictHandler.dictionaries["builtin"]
+		if current is self.builtinDict_filtered:
+			return current
+		if current is not self.builtinDict_original or self.builtinDict_filtered is None:
+			# 初めて有効にしたか、NVDA が組み込みの読み上げ辞書を読み込み直した
+			filtered = postProcessor.FusedSpeechDict(entry for entry in current if entry.pattern not in postProcessor.UNUSED_BUILTIN_PATTERNS)
+			if hasattr(current, "fileName"):
+				filtered.fileName = current.fileName
+			self.builtinDict_original = current
+			self.builtinDict_filtered = filtered
+		return self.builtinDict_filtered
+
+	def _getMode(self):
+		return ConversionMode.SPELL_ALL if self.getForceSpellOutSetting() else ConversionMode.STANDARD
+
+	def _convert(self, text):
+		mode = self._getMode()
+		if mode == ConversionMode.SPELL_ALL:
+			# 変換表で一度に変換できるので、控えや区切りながらの変換は使わない
+			return spellOut.convert(text)
+		if mode == ConversionMode.STANDARD and self.getTrackMissesSetting():
+			missTracker.tracker.feed(text)
+		# すべて読み上げ中なら、この先の部分の変換を別のスレッドで始めておく
+		self.prefetcher.lookAhead(mode)
+		converted = self.prefetcher.get(text, mode)
+		if converted is None and self.persistentCache is not None:
+			converted = self.persistentCache.get(text, mode)
+		if converted is None:
+			# 長い文字列は区切って変換し、読み上げの中止や時間の上限で打ち切れるようにする
+			converted, finished = chunkedConversion.convert(lambda chunk: self.converter.process(chunk, mode=mode), text)
+			# 途中で打ち切った結果を控えると、次からも一部が変換されないまま読まれてしまう
+			if finished and self.persistentCache is not None:
+				self.persistentCache.put(text, mode, converted)
+		return converted
+
+	def _convertMany(self, texts):
+		"""読み上げの列に含まれる複数の文字列を、まとめて変換する。"""
+		if not self._enabled:
+			return texts
+		mode = self._getMode()
+		if mode == ConversionMode.SPELL_ALL:
+			return [spellOut.convert(text) for text in texts]
+		if mode == ConversionMode.STANDARD and self.getTrackMissesSetting():
+			for text in texts:
+				missTracker.tracker.feed(text)
+		self.prefetcher.lookAhead(mode)
+		results = [self.prefetcher.get(text, mode) for text in texts]
+		if self.persistentCache is not None:
+			results = [self.persistentCache.get(text, mode) if result is None else result for text, result in zip(texts, results)]
+		missing = [i for i, result in enumerate(results) if result is None]
+		if not missing:
+			return results
+		targets = [texts[i] for i in missing]
+		if sum(len(text) for text in targets) > chunkedConversion.CHUNK_SIZE:
+			# 長い場合は、まとめずに区切って変換し、読み上げの中止や時間の上限で打ち切れるようにする
+			chunked = [chunkedConversion.convert(lambda chunk: self.converter.process(chunk, mode=mode), text) for text in targets]
+			converted = [text for text, finished in chunked]
+			complete = [finished for text, finished in chunked]
+		else:
+			converted = self.converter.process_many(targets, mode=mode)
+			complete = [True] * len(converted)
+		for i, text, finished in zip(missing, converted, complete):
+			results[i] = text
+			# 途中で打ち切った結果を控えると、次からも一部が変換されないまま読まれてしまう
+			if finished and self.persistentCache is not None:
+				self.persistentCache.put(texts[i], mode, text)
+		return results
 
 	def _setupMenu(self):
 		self.rootMenu = wx.Menu()
@@ -116,6 +253,22 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		if dictionarySwitcher.isAvailable():
 			self.devDictionaryToggleItem = self.rootMenu.Append(wx.ID_ANY, self.devDictionaryToggleString(), _("Switches between the bundled dictionary and the one under development."))
 			gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self.toggleDevDictionary, self.devDictionaryToggleItem)
+			self.devDictionaryReloadToggleItem = self.rootMenu.Append(wx.ID_ANY, self.devDictionaryReloadToggleString(), _("Toggles whether the dictionary under development is reloaded automatically when its files change."))
+			gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self.toggleDevDictionaryReload, self.devDictionaryReloadToggleItem)
+		if sequenceFilter.isAvailable():
+			self.sequenceFilterToggleItem = self.rootMenu.Append(wx.ID_ANY, self.sequenceFilterToggleString(), _("Toggles whether all strings in a speech sequence are converted together. This also works with automatic language switching."))
+			gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self.toggleSequenceFilter, self.sequenceFilterToggleItem)
+		self.trackMissesToggleItem = self.rootMenu.Append(wx.ID_ANY, self.trackMissesToggleString(), _("Toggles whether words not found in the dictionary are counted on this computer."))
+		gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self.toggleTrackMisses, self.trackMissesToggleItem)
+		self.exportMissesItem = self.rootMenu.Append(wx.ID_ANY, _("Export Unknown Words") + "...", _("Saves the words not found in the dictionary and their counts to a file."))
+		gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self.exportMisses, self.exportMissesItem)
+		self.persistentCacheToggleItem = self.rootMenu.Append(wx.ID_ANY, self.persistentCacheToggleString(), _("Toggles whether conversion results are saved on this computer and reused after restarting NVDA."))
+		gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self.togglePersistentCache, self.persistentCacheToggleItem)
+		if dictionaryShards.isAvailable():
+			self.lowMemoryToggleItem = self.rootMenu.Append(wx.ID_ANY, self.lowMemoryToggleString(), _("Toggles whether dictionaries are loaded only when needed to reduce memory usage."))
+			gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self.toggleLowMemory, self.lowMemoryToggleItem)
+		self.diagnosticsItem = self.rootMenu.Append(wx.ID_ANY, _("Show Diagnostics"), _("Shows information about dictionaries and memory usage for troubleshooting."))
+		gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self.showDiagnostics, self.diagnosticsItem)
 		# github issues
 		self.ghMenu = wx.Menu()
 		self.reportMisreadingsItem = self.ghMenu.Append(wx.ID_ANY, _("Report Misreadings") + "...", _("Report words that cannot be read correctly in English Reading Enhancer."))
@@ -193,6 +346,74 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 			log.exception("ERE: 開発中の辞書を適用できませんでした")
 			self.setDevDictionarySetting(False)
 
+	def _applyLowMemoryMode(self):
+		"""省メモリモードなら、頭文字ごとに分割した辞書を既定の辞書として使う。"""
+		if not self.getLowMemorySetting():
+			return
+		if not dictionaryShards.isAvailable():
+			log.info("ERE: 分割した辞書が無いため、省メモリモードを使えません")
+			return
+		try:
+			tables = dictionaryShards.load(config.conf["ERE_global"]["lowMemoryLimit"] * 1024)
+			dictionarySwitcher.replaceDefaults(tables)
+		except Exception:
+			log.exception("ERE: 省メモリモードを適用できませんでした")
+
+	def getLowMemorySetting(self):
+		return config.conf["ERE_global"]["lowMemoryMode"]
+
+	def setLowMemorySetting(self, val):
+		config.conf["ERE_global"]["lowMemoryMode"] = val
+
+	def lowMemoryToggleString(self):
+		return _("Disable Low Memory Mode") if self.getLowMemorySetting() is True else _("Enable Low Memory Mode")
+
+	def toggleLowMemory(self, evt):
+		changed = not self.getLowMemorySetting()
+		self.setLowMemorySetting(changed)
+		msg = _("Low Memory Mode will be enabled after restarting NVDA.") if changed is True else _("Low Memory Mode will be disabled after restarting NVDA.")
+		self.lowMemoryToggleItem.SetItemLabel(self.lowMemoryToggleString())
+		compatibilityUtil.messageBox(msg, _("Settings changed"))
+
+	def _startPersistentCache(self):
+		"""変換結果の控えを、NVDA の設定ディレクトリから別のスレッドで読み込み始める。"""
+		if globalVars.appArgs.secure:
+			return
+		self.persistentCache = persistentCache.PersistentCache(os.path.join(globalVars.appArgs.configPath, persistentCache.FILE_NAME))
+		self.persistentCache.start()
+
+	def _stopPersistentCache(self, remove=False):
+		if self.persistentCache is None:
+			return
+		cache = self.persistentCache
+		self.persistentCache = None
+		cache.stop(remove=remove)
+
+	def getPersistentCacheSetting(self):
+		return config.conf["ERE_global"]["persistentCache"]
+
+	def setPersistentCacheSetting(self, val):
+		config.conf["ERE_global"]["persistentCache"] = val
+		if val:
+			self._startPersistentCache()
+		else:
+			# 読み上げた文字列が含まれるため、使わなくなったらファイルも残さない
+			self._stopPersistentCache(remove=True)
+
+	def persistentCacheToggleString(self):
+		return _("Stop saving conversion results") if self.getPersistentCacheSetting() is True else _("Start saving conversion results")
+
+	def togglePersistentCache(self, evt):
+		changed = not self.getPersistentCacheSetting()
+		self.setPersistentCacheSetting(changed)
+		msg = _("Conversion results will be saved on this computer and reused after restarting NVDA. The saved text is never sent anywhere.") if changed is True else _("Conversion results will no longer be saved. The saved results have been deleted.")
+		self.persistentCacheToggleItem.SetItemLabel(self.persistentCacheToggleString())
+		compatibilityUtil.messageBox(msg, _("Settings changed"))
+
+	def showDiagnostics(self, evt):
+		import ui
+		ui.browseableMessage(diagnostics.report(self.persistentCache), _("Diagnostics"))
+
 	def toggleDevDictionary(self, evt):
 		changed = not self.getDevDictionarySetting()
 		try:
@@ -215,6 +436,26 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 	def setDevDictionarySetting(self, val):
 		config.conf["ERE_global"]["useDevDictionary"] = val
 
+	def getDevDictionaryReloadSetting(self):
+		return config.conf["ERE_global"]["reloadDevDictionary"]
+
+	def setDevDictionaryReloadSetting(self, val):
+		config.conf["ERE_global"]["reloadDevDictionary"] = val
+		if val:
+			self.devDictionaryWatcher.start()
+		else:
+			self.devDictionaryWatcher.stop()
+
+	def devDictionaryReloadToggleString(self):
+		return _("Stop reloading the dictionary under development automatically") if self.getDevDictionaryReloadSetting() is True else _("Reload the dictionary under development automatically")
+
+	def toggleDevDictionaryReload(self, evt):
+		changed = not self.getDevDictionaryReloadSetting()
+		self.setDevDictionaryReloadSetting(changed)
+		msg = _("The dictionary under development will be reloaded when its files change.") if changed is True else _("The dictionary under development will no longer be reloaded automatically.")
+		self.devDictionaryReloadToggleItem.SetItemLabel(self.devDictionaryReloadToggleString())
+		compatibilityUtil.messageBox(msg, _("Settings changed"))
+
 	def devDictionaryToggleString(self):
 		return _("Switch back to the bundled dictionary") if self.getDevDictionarySetting() is True else _("Switch to the dictionary under development")
 
@@ -227,6 +468,65 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 	def forceSpellOutToggleString(self):
 		return _("Disable Forced Spell-out Mode") if self.getForceSpellOutSetting() is True else _("Enable Forced Spell-out Mode")
 
+	def getSequenceFilterSetting(self):
+		return config.conf["ERE_global"]["useSequenceFilter"]
+
+	def setSequenceFilterSetting(self, val):
+		# 変換の組み込み方が変わるので、組み込み直す
+		self._uninstall()
+		config.conf["ERE_global"]["useSequenceFilter"] = val
+		self._install()
+
+	def sequenceFilterToggleString(self):
+		return _("Convert each speech string separately") if self.getSequenceFilterSetting() is True else _("Convert whole speech sequences together")
+
+	def toggleSequenceFilter(self, evt):
+		changed = not self.getSequenceFilterSetting()
+		self.setSequenceFilterSetting(changed)
+		msg = _("All strings in a speech sequence will be converted together.") if changed is True else _("Each speech string will be converted separately.")
+		self.sequenceFilterToggleItem.SetItemLabel(self.sequenceFilterToggleString())
+		compatibilityUtil.messageBox(msg, _("Settings changed"))
+
+	def getTrackMissesSetting(self):
+		return config.conf["ERE_global"]["trackMisses"]
+
+	def setTrackMissesSetting(self, val):
+		config.conf["ERE_global"]["trackMisses"] = val
+		if not val:
+			missTracker.tracker.clear()
+
+	def trackMissesToggleString(self):
+		return _("Stop counting unknown words") if self.getTrackMissesSetting() is True else _("Start counting unknown words")
+
+	def toggleTrackMisses(self, evt):
+		changed = not self.getTrackMissesSetting()
+		self.setTrackMissesSetting(changed)
+		msg = _("Words not found in the dictionary will be counted. The result is kept on this computer and never sent anywhere.") if changed is True else _("Words not found in the dictionary will no longer be counted. The counts so far have been discarded.")
+		self.trackMissesToggleItem.SetItemLabel(self.trackMissesToggleString())
+		compatibilityUtil.messageBox(msg, _("Settings changed"))
+
+	def exportMisses(self, evt):
+		if gui.message.isModalMessageBoxActive():
+			return
+		if not len(missTracker.tracker):
+			compatibilityUtil.messageBox(_("No unknown words have been counted yet."), _("Error"))
+			return
+		gui.mainFrame.prePopup()
+		d = wx.FileDialog(gui.mainFrame, _("Export Unknown Words"), wildcard=_("Text files") + " (*.txt)|*.txt", defaultFile="unknownWords.txt", style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+		res = gui.message.displayDialogAsModal(d)
+		path = d.GetPath()
+		d.Destroy()
+		gui.mainFrame.postPopup()
+		if res == wx.ID_CANCEL:
+			return
+		try:
+			count = missTracker.tracker.export(path)
+		except OSError:
+			log.exception("ERE: 辞書に無い単語を書き出せませんでした")
+			compatibilityUtil.messageBox(_("Failed to export unknown words."), _("Error"))
+			return
+		compatibilityUtil.messageBox(_("Exported %d words.") % count, _("Success"))
+
 	# github issues
 	def reportMisreadings(self, evt):
 		# 多重起動防止
@@ -237,7 +537,9 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 			return
 		from .dialogs import reportMisreadingsDialog
 		gui.mainFrame.prePopup()
-		dialog = reportMisreadingsDialog.ReportMisreadingsDialog(gui.mainFrame)
+		# 辞書に無い単語を数えている場合は、多いものから候補として出す
+		suggestions = [word.lower() for word, count, error in missTracker.tracker.top(20)]
+		dialog = reportMisreadingsDialog.ReportMisreadingsDialog(gui.mainFrame, suggestions=suggestions)
 		res = gui.message.displayDialogAsModal(dialog)
 		dialog.Destroy()
 		gui.mainFrame.postPopup()
@@ -245,7 +547,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 			return
 		# retrieve data from dialog
 		eng = dialog.wordEdit.GetValue().strip()
-		oldKana = EnglishToKanaConverter().process(eng)
+		oldKana = converter.get().process(eng)
 		newKana = dialog.pronunciationEdit.GetValue().strip()
 		comment = dialog.commentEdit.GetValue().strip()
 		# validation
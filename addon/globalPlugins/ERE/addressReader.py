@@ -0,0 +1,106 @@
+# coding: UTF-8
+
+"""URL、メールアドレス、Windows のパスを、決まった方法で手早く読みに変える。
+
+Web ページや端末の出力に含まれる長い URL などは、そのまま変換器に渡すと、
+細かく分かれた断片の1つずつが辞書の検索と、見つからない場合の処理を通る。
+読み上げとしても、記号の読みがばらばらになり、長いものは読み終わるまで待たされる。
+
+ここでは変換の前に、1つの正規表現でこれらをまとめて見つけ、次の決まった方法で読みにする。
+
+* 英字の部分は、辞書の見出し語なら辞書の読み、そうでなければ1文字ずつのスペルアウト
+* 数字の部分は、そのまま
+* 区切りの記号は、_SEPARATORS の表で読みにする
+
+読みにするのは先頭の maxLength 文字までとし、それより長い分は「以下省略」として読まない。
+"""
+
+import re
+
+from ._englishToKanaConverter.englishToKanaConverter import ConversionMode, dictionaries
+
+# 読みにする文字数の既定の上限。0 なら上限を設けない
+DEFAULT_MAX_LENGTH = 80
+maxLength = DEFAULT_MAX_LENGTH
+
+# 上限を超えた分の代わりに読む文字列
+_OMITTED = "以下省略"
+
+# 文中の URL の直後によく現れる、URL には含めない文字
+_TRAILING = r"(?<![.,;:!?)])"
+_URL_CHARS = r"[^\s<>\"'、。「」（）()]"
+
+_ADDRESS = re.compile(
+	r"(?:https?|ftp|file)://" + _URL_CHARS + r"+" + _TRAILING
+	+ r"|www\.[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+" + _URL_CHARS + r"*" + _TRAILING
+	+ r"|[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+"
+	+ r"|(?:[A-Za-z]:|\\\\[A-Za-z0-9._$-]+)\\[^\s<>\"|?*、。]*" + _TRAILING
+)
+
+_SEGMENT = re.compile(r"[A-Za-z]+|[0-9]+|.", re.S)
+
+_SEPARATORS = {
+	"/": "スラッシュ",
+	"\\": "バックスラッシュ",
+	".": "ドット",
+	":": "コロン",
+	"@": "アットマーク",
+	"-": "ハイフン",
+	"_": "アンダーバー",
+	"?": "クエスチョン",
+	"=": "イコール",
+	"&": "アンド",
+	"#": "シャープ",
+	"%": "パーセント",
+	"+": "プラス",
+	"~": "チルダ",
+	"$": "ドル",
+}
+
+
+def _spell(word):
+	spell = dictionaries.SPELL
+	return " ".join(spell.get(ch, ch) for ch in word.upper())
+
+
+def _readWord(word, mode):
+	if mode != ConversionMode.SPELL_ALL:
+		key = word.upper()
+		reading = dictionaries.WORDS.get(key)
+		if reading is None:
+			reading = dictionaries.PHRASES.get(key)
+		if reading is not None:
+			return reading
+	return _spell(word)
+
+
+def read(address, mode=ConversionMode.STANDARD, limit=None):
+	"""URL などを1つ読みにする。"""
+	if limit is None:
+		limit = maxLength
+	omitted = limit and len(address) > limit
+	if omitted:
+		address = address[:limit]
+	parts = []
+	for segment in _SEGMENT.findall(address):
+		if segment.isalpha():
+			parts.append(_readWord(segment, mode))
+		elif segment.isdigit():
+			parts.append(segment)
+		else:
+			parts.append(_SEPARATORS.get(segment, segment))
+	if omitted:
+		parts.append(_OMITTED)
+	return " ".join(parts)
+
+
+def search(text):
+	"""text の中で最初に見つかった URL などの match を返す。無ければ None。"""
+	return _ADDRESS.search(text)
+
+
+def replace(text, mode=ConversionMode.STANDARD):
+	"""text に含まれる URL などを、すべて読みにして返す。"""
+	if not ("/" in text or "@" in text or "\\" in text or "www." in text):
+		return text
+	return _ADDRESS.sub(lambda match: read(match.group(), mode), text)
@@ -0,0 +1,149 @@
+# coding: UTF-8
+
+"""長い文字列を区切りながら変換し、読み上げの中止と処理時間の上限に対応する。
+
+すべて読み上げや、大きなテキストフィールドの読み上げでは、数十KBの文字列が
+一度に processText に渡されることがある。変換が終わるまで読み上げは始まらず、
+利用者が Ctrl キーで読み上げを止めても、変換だけは最後まで続いてしまう。
+
+そこで、一定の長さを超える文字列は文や単語の切れ目で区切って少しずつ変換し、
+区切りごとに次の2点を確かめる。どちらかに当てはまれば、残りは変換せずにそのまま音声エンジンへ渡す。
+アドオンを無効にしたときと同じ読み方になるが、どれだけ長い文字列でも、変換による待ち時間には上限ができる。
+
+* 変換を始めてから、キーが押されたかどうか
+* 1回の呼び出しで使った時間が上限を超えたかどうか
+
+読み上げの中止は、NVDA のメインスレッドで行われる。変換している間はそのメインスレッドが
+processText の中で止まっているので、speechCanceled などの通知は変換が終わるまで届かない。
+そこで、キーボードフックのスレッドから呼ばれる inputCore.decide_handleRawKey で、キーが押されたことを
+直接 token に伝える。押されたキーで読み上げが中止されるとは限らないため、変換をやめた後の残りも捨てずに返す。
+中止されていれば、返した文字列は読み上げられずに捨てられる。
+"""
+
+import re
+import threading
+import time
+
+from logHandler import log
+
+# これ以下の長さの文字列は、区切らずにそのまま変換する
+CHUNK_SIZE = 2000
+
+# 1回の呼び出しで変換に使ってよい時間（秒）
+TIME_BUDGET = 0.3
+
+# 区切る位置の候補。文の終わりか改行を優先し、見つからなければ空白で区切る
+_SENTENCE_END = re.compile(r"[.!?。！？]\s+|\n")
+_SPACE = re.compile(r"\s+")
+
+
+# 押しても変換をやめないキー。Shift キーは、すべて読み上げを中止せずに一時停止する
+_IGNORED_KEYS = frozenset((
+	0x10,  # VK_SHIFT
+	0xA0,  # VK_LSHIFT
+	0xA1,  # VK_RSHIFT
+))
+
+
+class CancelToken:
+	"""キーが押されたことを、変換中の処理に伝える。
+
+	キーが押されるたびに世代を進める。変換を始める時点の世代を控えておき、
+	途中で世代が変わっていれば中止されたと判断する。
+	"""
+
+	def __init__(self):
+		self._generation = 0
+		self._lock = threading.Lock()
+
+	def cancel(self, *args, **kwargs):
+		with self._lock:
+			self._generation += 1
+
+	def snapshot(self):
+		return self._generation
+
+	def isCancelled(self, snapshot):
+		return self._generation != snapshot
+
+
+token = CancelToken()
+
+
+def _handleRawKey(vkCode=None, pressed=True, **kwargs):
+	"""キーボードフックのスレッドから呼ばれる。キーの処理を妨げないよう、常に True を返す。"""
+	if pressed and vkCode not in _IGNORED_KEYS:
+		token.cancel()
+	return True
+
+
+def register():
+	"""キーが押されたときに、token へ伝わるようにする。"""
+	try:
+		import inputCore
+		inputCore.decide_handleRawKey.register(_handleRawKey)
+	except (ImportError, AttributeError):
+		# decide_handleRawKey の無い古い NVDA では、時間の上限だけで打ち切る
+		log.debug("ERE: decide_handleRawKey is not available")
+
+
+def unregister():
+	try:
+		import inputCore
+		inputCore.decide_handleRawKey.unregister(_handleRawKey)
+	except (ImportError, AttributeError):
+		pass
+
+
+def split(text, size=CHUNK_SIZE):
+	"""text を、おおむね size 文字ごとに、文か単語の切れ目で区切る。"""
+	start = 0
+	length = len(text)
+	while length - start > size:
+		limit = start + size
+		end = _lastMatchEnd(_SENTENCE_END, text, start + size // 2, limit)
+		if end is None:
+			end = _lastMatchEnd(_SPACE, text, start, limit)
+		if end is None:
+			# 空白が全く無い。単語の途中で切るよりは、次の空白まで伸ばす
+			m = _SPACE.search(text, limit)
+			if m is None:
+				break
+			end = m.end()
+		yield text[start:end]
+		start = end
+	if start < length:
+		yield text[start:]
+
+
+def _lastMatchEnd(pattern, text, start, limit):
+	end = None
+	for m in pattern.finditer(text, start, limit):
+		end = m.end()
+	return end
+
+
+def convert(process, text, budget=TIME_BUDGET, size=CHUNK_SIZE):
+	"""process で text を変換する。長い文字列は区切って変換し、キーの入力と時間の上限を確かめる。
+
+	process には、文字列を1つ受け取って変換結果を返す関数を渡す。
+	(変換結果, すべて変換したか) を返す。途中で打ち切った場合、変換結果の残りの部分は変換されていない。
+	"""
+	if len(text) <= size:
+		return process(text), True
+	snapshot = token.snapshot()
+	deadline = time.perf_counter() + budget
+	converted = []
+	consumed = 0
+	for chunk in split(text, size):
+		if token.isCancelled(snapshot):
+			log.debug("ERE: key pressed, %d characters left unconverted" % (len(text) - consumed))
+			converted.append(text[consumed:])
+			return "".join(converted), False
+		if consumed and time.perf_counter() > deadline:
+			log.debug("ERE: time budget exceeded, %d characters left unconverted" % (len(text) - consumed))
+			converted.append(text[consumed:])
+			return "".join(converted), False
+		converted.append(process(chunk))
+		consumed += len(chunk)
+	return "".join(converted), True
@@ -0,0 +1,193 @@
+# coding: UTF-8
+
+"""パッケージに圧縮して含めた辞書を、初回の起動時に展開して使う。
+
+アドオンのパッケージの大部分は englishToKanaConverter の辞書の JSON で、
+更新のたびにダウンロードする大きさもこれで決まる。正式なビルドでは、
+tools/build_compressed_dictionaries.py で辞書を xz で圧縮して _compressedDictionaries に置き、
+元の JSON はパッケージに含めない。
+
+起動時に元の JSON が無く、圧縮した辞書がある場合は、次のようにする。
+
+* NVDA の設定ディレクトリの ERE_dictionaryCache の下に、アドオンの版と辞書の内容から決めた
+  ディレクトリを作り、初回だけそこへ展開する。2回目以降は展開したものをそのまま読む。
+  版が変わったら作り直し、古い版のものは消す
+* 読み込んだ辞書を持つ dictionaries モジュールを作って sys.modules に登録してから、
+  変換器を読み込む。変換器は辞書を ``dictionaries.PHRASES`` のようにモジュール属性として
+  参照するだけなので、元の JSON から読み込んだ場合と同じように動く
+* セキュアモードでは設定ディレクトリに書き込まず、毎回メモリ上で展開する
+* 省メモリモードで使う頭文字ごとに分割した辞書もパッケージには含めず、
+  dictionaryShards が、展開先のディレクトリにある JSON から作る
+* 圧縮した辞書が壊れているなどで読み込めなければ、ログに記録して何もしない。
+  変換器は、元の dictionaries モジュールを読み込む
+
+この処理は変換器より先に行う必要があるため、__init__.py の最初で prepare() を呼ぶ。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import types
+
+from logHandler import log
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(__file__), "_compressedDictionaries")
+MANIFEST_FILE = "manifest.json"
+CACHE_DIR_NAME = "ERE_dictionaryCache"
+
+# 圧縮した辞書のファイル名に付ける拡張子
+EXTENSION = ".xz"
+
+# 展開した辞書を置いたディレクトリ。メモリ上で展開したか、圧縮した辞書を使っていなければ None
+_cacheDirectory = None
+
+# 変換器の辞書のディレクトリと、そのモジュール名
+DICTIONARIES_DIR = os.path.join(os.path.dirname(__file__), "_englishToKanaConverter", "englishToKanaConverter", "dictionaries")
+DICTIONARIES_MODULE = __name__.rpartition(".")[0] + "._englishToKanaConverter.englishToKanaConverter.dictionaries"
+
+# ファイル名と、dictionaries のモジュール属性の対応。dictionarySwitcher._TARGETS と同じ
+TARGETS = {
+	"phrases": "PHRASES",
+	"prefix": "PREFIX",
+	"roman": "ROMAN",
+	"spell": "SPELL",
+	"suffix": "SUFFIX",
+	"words": "WORDS",
+}
+
+
+def loadManifest():
+	"""圧縮した辞書の目録。パッケージに含まれていなければ None。"""
+	try:
+		with open(os.path.join(PAYLOAD_DIR, MANIFEST_FILE), encoding="utf-8") as f:
+			return json.load(f)
+	except FileNotFoundError:
+		return None
+
+
+def isNeeded():
+	"""元の JSON が無く、圧縮した辞書から読み込む必要があるか。"""
+	if not os.path.isfile(os.path.join(PAYLOAD_DIR, MANIFEST_FILE)):
+		return False
+	return not any(
+		os.path.isfile(os.path.join(DICTIONARIES_DIR, "%s.json" % name))
+		for name in TARGETS
+	)
+
+
+def originalHashes():
+	"""圧縮する前の JSON の sha1。変換器のディレクトリからの相対パス→16進数の文字列。"""
+	try:
+		manifest = loadManifest()
+		if manifest is None:
+			return {}
+		return {
+			"dictionaries/%s.json" % name: info["sha1"]
+			for name, info in manifest["files"].items()
+		}
+	except (ValueError, KeyError, TypeError, AttributeError):
+		# 壊れた目録は、prepare() でも使われていない
+		return {}
+
+
+def cacheDirectory():
+	"""展開した辞書の JSON を置いたディレクトリ。無ければ None。"""
+	return _cacheDirectory
+
+
+def _cacheRoot():
+	import globalVars
+	return os.path.join(globalVars.appArgs.configPath, CACHE_DIR_NAME)
+
+
+def _decompress(name):
+	import lzma
+	with lzma.open(os.path.join(PAYLOAD_DIR, "%s.json%s" % (name, EXTENSION))) as f:
+		return f.read()
+
+
+def _removeStaleCaches(root, key):
+	try:
+		names = os.listdir(root)
+	except FileNotFoundError:
+		return
+	for name in names:
+		if name != key:
+			shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _readCached(directory, name, sha1):
+	"""展開済みの name を読む。無いか、内容が壊れていれば None。"""
+	try:
+		with open(os.path.join(directory, "%s.json" % name), "rb") as f:
+			data = f.read()
+	except FileNotFoundError:
+		return None
+	if hashlib.sha1(data).hexdigest() != sha1:
+		log.warning("ERE: 展開済みの辞書 %s.json が壊れているため、展開し直します" % name)
+		return None
+	return data
+
+
+def _writeCached(directory, name, data):
+	path = os.path.join(directory, "%s.json" % name)
+	temp = path + ".tmp"
+	with open(temp, "wb") as f:
+		f.write(data)
+	# 書き込みの途中で NVDA が終了しても、壊れたファイルが残らないようにする
+	os.replace(temp, path)
+
+
+def load(manifest, useCache=True):
+	"""圧縮した辞書を展開して読み込み、属性名→辞書を返す。"""
+	directory = None
+	if useCache:
+		root = _cacheRoot()
+		directory = os.path.join(root, manifest["key"])
+		_removeStaleCaches(root, manifest["key"])
+		os.makedirs(directory, exist_ok=True)
+	tables = {}
+	decompressed = 0
+	for name, info in manifest["files"].items():
+		data = _readCached(directory, name, info["sha1"]) if directory else None
+		if data is None:
+			data = _decompress(name)
+			decompressed += 1
+			if directory:
+				_writeCached(directory, name, data)
+		tables[TARGETS[name]] = json.loads(data.decode("utf-8"))
+	if decompressed:
+		log.info("ERE: 圧縮した辞書を %d 件展開しました (%s)" % (decompressed, directory or "メモリ上"))
+	return tables
+
+
+def prepare():
+	"""必要なら圧縮した辞書を読み込み、変換器が読み込む dictionaries モジュールとして登録する。"""
+	if DICTIONARIES_MODULE in sys.modules or not isNeeded():
+		return
+	global _cacheDirectory
+	import globalVars
+	try:
+		manifest = loadManifest()
+		useCache = not globalVars.appArgs.secure
+		try:
+			tables = load(manifest, useCache=useCache)
+		except OSError:
+			log.error("ERE: 展開した辞書を保存できないため、メモリ上で展開します", exc_info=True)
+			useCache = False
+			tables = load(manifest, useCache=False)
+	except Exception:
+		# 目録や圧縮したファイルが壊れている。起動は止めず、元の dictionaries モジュールに任せる
+		log.error("ERE: 圧縮した辞書を読み込めませんでした", exc_info=True)
+		return
+	module = types.ModuleType(DICTIONARIES_MODULE)
+	module.__file__ = os.path.join(DICTIONARIES_DIR, "__init__.py")
+	module.__path__ = [DICTIONARIES_DIR]
+	module.__package__ = DICTIONARIES_MODULE
+	for attribute, table in tables.items():
+		setattr(module, attribute, table)
+	sys.modules[DICTIONARIES_MODULE] = module
+	if useCache:
+		_cacheDirectory = os.path.join(_cacheRoot(), manifest["key"])
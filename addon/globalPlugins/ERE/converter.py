@@ -0,0 +1,145 @@
+# coding: UTF-8
+
+"""englishToKanaConverter に、複数の文字列をまとめて変換する機能を加える。
+
+名前、役割、値、説明のように、1回の読み上げが複数の文字列に分かれていることは多い。
+1つずつ process を呼ぶと、呼び出しごとの準備の手間がその数だけかかってしまう。
+process_many では、変換の対象にならない区切り文字で文字列をつないで1回で変換し、
+変換後にまた区切り文字で分ける。同じ文字列が複数含まれていれば、1回だけ変換する。
+materializedReadings の表を引くことと、addressReader と identifierSplitter の前処理とは、
+つなぐ前に文字列ごとに行う。つないだ後に行うと、URL などが区切り文字をまたいで見つかってしまう。
+
+process では、ビルド時に変換しておいた materializedReadings の表を先に引き、
+文字列全体が見つかればそのまま返す。見つからなければ、addressReader で URL などを読みにし、
+通常のモードでは identifierSplitter で識別子を単語に分けてから変換する。
+
+process_iter では、文や節の切れ目ごとに変換した結果を順に返す。最初の文の変換結果は、
+残りを変換する前に受け取れる。文字列のほか、行を順に返すイテレーターも受け取れ、
+手元に置く未変換の文字列は bufferSize 程度に収まるので、大きなファイルも一定のメモリで変換できる。
+
+変換器はプロセス全体で1つだけ作り、get() で取り出して使う。
+"""
+
+import re
+import threading
+
+from . import addressReader
+from . import identifierSplitter
+from . import materializedReadings
+from ._englishToKanaConverter.englishToKanaConverter import EnglishToKanaConverter, ConversionMode
+
+# 私用領域の文字。アルファベットではないので、変換の前後でそのまま残る
+_SEPARATOR = "\ue000"
+
+# process_iter で、切れ目が見つからなくても変換を始める長さ
+ITER_BUFFER_SIZE = 2000
+
+# 文の終わり。閉じ括弧や引用符が続いていれば、それも含める
+_SENTENCE_END = re.compile(r"[.!?。！？]+[\"')\]」』）]*\s+|\n")
+# 節の切れ目。文の終わりが見つからないまま長くなったときに使う。
+# https: や C: で URL などを分けてしまわないよう、半角の記号は後に空白があるものだけとする
+_CLAUSE_END = re.compile(r"[,;:]\s+|[、，；]\s*")
+_SPACE = re.compile(r"\s+")
+
+
+def _cutPoint(buffer, size):
+	"""buffer の先頭から変換してよい長さ。まだ待つべきなら None。"""
+	match = _SENTENCE_END.search(buffer)
+	if match is not None:
+		return match.end()
+	if len(buffer) <= size:
+		return None
+	head = buffer[:size]
+	for pattern in (_CLAUSE_END, _SPACE):
+		ends = [m.end() for m in pattern.finditer(head)]
+		if ends:
+			return ends[-1]
+	# 長い単語や URL の途中。単語の途中で切るよりは、次の空白まで待つ
+	match = _SPACE.search(buffer, size)
+	if match is not None:
+		return match.end()
+	if len(buffer) <= size * 2:
+		return None
+	# 空白の全く無い長い文字列。手元に置く量を抑えるため、単語の途中でも区切る。
+	# ただし URL などが始まっていれば、その手前で区切る
+	match = addressReader.search(head)
+	if match is not None and match.start() > 0:
+		return match.start()
+	return size
+
+
+class Converter(EnglishToKanaConverter):
+	def process(self, text, mode=ConversionMode.STANDARD):
+		reading = materializedReadings.readings.lookup(text, mode)
+		if reading is not None:
+			return reading
+		return super().process(self._prepare(text, mode), mode=mode)
+
+	def _prepare(self, text, mode):
+		"""変換器に渡す前に、URL などを読みにし、通常のモードでは識別子を単語に分ける。"""
+		text = addressReader.replace(text, mode)
+		if mode == ConversionMode.STANDARD:
+			text = identifierSplitter.split(text)
+		return text
+
+	def process_many(self, texts, mode=ConversionMode.STANDARD):
+		"""texts の各文字列を変換し、同じ順番のリストで返す。"""
+		texts = list(texts)
+		unique = list(dict.fromkeys(texts))
+		if not unique:
+			return []
+		if len(unique) == 1:
+			converted = {unique[0]: self.process(unique[0], mode=mode)}
+			return [converted[text] for text in texts]
+		if any(_SEPARATOR in text for text in unique):
+			# 元から区切り文字を含んでいると、正しく分けられない
+			return [self.process(text, mode=mode) for text in texts]
+		converted = {}
+		for text in unique:
+			reading = materializedReadings.readings.lookup(text, mode)
+			if reading is not None:
+				converted[text] = reading
+		rest = [text for text in unique if text not in converted]
+		if rest:
+			# URL などが区切り文字をまたいで見つからないよう、前処理は文字列ごとに行う
+			prepared = [self._prepare(text, mode) for text in rest]
+			results = super().process(_SEPARATOR.join(prepared), mode=mode).split(_SEPARATOR)
+			if len(results) != len(rest):
+				# 区切り文字の前後がつながって変換された。1つずつ変換し直す
+				results = [super(Converter, self).process(text, mode=mode) for text in prepared]
+			converted.update(zip(rest, results))
+		return [converted[text] for text in texts]
+
+	def process_iter(self, source, mode=ConversionMode.STANDARD, bufferSize=ITER_BUFFER_SIZE):
+		"""source を文や節の切れ目ごとに変換し、変換結果を順に返すジェネレーター。
+
+		source には、文字列か、文字列（ファイルの行など）を順に返すイテレーターを渡す。
+		返す文字列をすべてつなげると、source 全体の変換結果になる。
+		"""
+		if isinstance(source, str):
+			source = (source,)
+		buffer = ""
+		for piece in source:
+			buffer += piece
+			while buffer:
+				cut = _cutPoint(buffer, bufferSize)
+				if cut is None:
+					break
+				yield self.process(buffer[:cut], mode=mode)
+				buffer = buffer[cut:]
+		if buffer:
+			yield self.process(buffer, mode=mode)
+
+
+_instance = None
+_lock = threading.Lock()
+
+
+def get():
+	"""プロセス全体で共有する Converter を返す。"""
+	global _instance
+	if _instance is None:
+		with _lock:
+			if _instance is None:
+				_instance = Converter()
+	return _instance
@@ -0,0 +1,25 @@
+# coding: UTF-8
+
+"""不具合の調査や、メモリ・速度の改善のための診断情報をまとめる。
+
+利用者に見せるのは開発者に伝えてもらうためなので、dictionarySwitcher.describe() と同じく
+日本語の固定の文字列で返す。
+"""
+
+from . import dictionaryShards
+from . import dictionarySwitcher
+from . import materializedReadings
+from . import missTracker
+
+
+def report(persistentCache=None):
+	"""診断情報を返す。persistentCache には、使っていれば persistentCache.PersistentCache を渡す。"""
+	sections = []
+	sections.append(("辞書", "%s\n世代: %d" % (dictionarySwitcher.describe(), dictionarySwitcher.getGeneration())))
+	shards = dictionaryShards.describe()
+	sections.append(("省メモリモード", shards if shards is not None else "無効"))
+	sections.append(("変換済みの読み", materializedReadings.readings.describe()))
+	sections.append(("変換結果の保存", persistentCache.describe() if persistentCache is not None else "無効"))
+	tracker = missTracker.tracker
+	sections.append(("辞書に無い単語の集計", "保持している単語: %d 件, 数えた回数: %d 回" % (len(tracker), tracker.total)))
+	return "\n\n".join("■%s\n%s" % (title, body) for title, body in sections)
@@ -2,6 +2,7 @@
 
 import wx
 from .. import compatibilityUtil
+from .. import headwordIndex
 
 # 翻訳が当たるようにする
 try:
@@ -10,21 +11,41 @@ try:
 except:
 	_ = lambda x : x
 
+# 入力が止まってから、現在の読みと近い見出し語を調べるまでの時間（ミリ秒）
+LOOKUP_DELAY = 150
+
 class ReportMisreadingsDialog(wx.Dialog):
-	def __init__(self, *args, **kwds):
+	def __init__(self, *args, suggestions=(), **kwds):
 		wx.Dialog.__init__(self, *args, **kwds)
 		self.SetTitle(_("Report Misreadings"))
 
 		vSizer = wx.BoxSizer(wx.VERTICAL)
 
-		gridSizer = wx.GridSizer(3, 2, 10, 10)
+		gridSizer = wx.GridSizer(5, 2, 10, 10)
 		vSizer.Add(gridSizer, 1, wx.EXPAND, 0)
 
 		wordLabel = wx.StaticText(self, wx.ID_ANY, _("Word"))
 		gridSizer.Add(wordLabel, 0, 0, 0)
 
-		self.wordEdit = wx.TextCtrl(self, wx.ID_ANY, "")
+		# 辞書に無い単語の候補があれば、一覧から選べるようにする
+		if suggestions:
+			self.wordEdit = wx.ComboBox(self, wx.ID_ANY, "", choices=list(suggestions), style=wx.CB_DROPDOWN)
+		else:
+			self.wordEdit = wx.TextCtrl(self, wx.ID_ANY, "")
 		gridSizer.Add(self.wordEdit, 0, 0, 0)
+		self.wordEdit.Bind(wx.EVT_TEXT, self.wordChangedEvent)
+
+		readingLabel = wx.StaticText(self, wx.ID_ANY, _("Current reading"))
+		gridSizer.Add(readingLabel, 0, 0, 0)
+
+		self.readingEdit = wx.TextCtrl(self, wx.ID_ANY, "", style=wx.TE_READONLY)
+		gridSizer.Add(self.readingEdit, 0, 0, 0)
+
+		similarLabel = wx.StaticText(self, wx.ID_ANY, _("Similar words in the dictionary"))
+		gridSizer.Add(similarLabel, 0, 0, 0)
+
+		self.similarList = wx.ListBox(self, wx.ID_ANY)
+		gridSizer.Add(self.similarList, 0, 0, 0)
 
 		pronunciationLabel = wx.StaticText(self, wx.ID_ANY, _("Pronunciation"))
 		gridSizer.Add(pronunciationLabel, 0, 0, 0)
@@ -59,6 +80,40 @@ class ReportMisreadingsDialog(wx.Dialog):
 
 		self.Layout()
 
+		# 入力のたびに調べず、入力が止まってから別のスレッドで調べる
+		self.lookupTimer = wx.CallLater(LOOKUP_DELAY, self.lookup)
+		self.lookupTimer.Stop()
+		self.searcher = headwordIndex.Searcher(lambda result: wx.CallAfter(self.showLookup, result))
+		self.Bind(wx.EVT_WINDOW_DESTROY, self.destroyEvent)
+
+	def wordChangedEvent(self, event: wx.CommandEvent):
+		self.lookupTimer.Start(LOOKUP_DELAY)
+		event.Skip()
+
+	def lookup(self):
+		text = self.wordEdit.GetValue().strip()
+		if not text:
+			self.readingEdit.SetValue("")
+			self.similarList.Clear()
+			return
+		self.searcher.search(text)
+
+	def showLookup(self, result):
+		# 調べている間にダイアログが閉じられたか、入力が変わった
+		if not self or result.text != self.wordEdit.GetValue().strip():
+			return
+		if result.registered:
+			self.readingEdit.SetValue(_("%s (in the dictionary)") % result.reading)
+		else:
+			self.readingEdit.SetValue(result.reading)
+		self.similarList.Set(["%s: %s" % (headword, reading) for headword, reading in result.suggestions])
+
+	def destroyEvent(self, event: wx.WindowDestroyEvent):
+		if event.GetEventObject() is self:
+			self.lookupTimer.Stop()
+			self.searcher.stop()
+		event.Skip()
+
 	def okButtonPressedEvent(self, event: wx.CommandEvent):
 		# validation
 		z = zip(
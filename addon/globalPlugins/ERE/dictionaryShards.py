@@ -0,0 +1,232 @@
+# coding: UTF-8
+
+"""省メモリモードで使う、頭文字ごとに分割した辞書。
+
+通常は、めったに読み上げられない単語まで含め、すべての辞書を読み込んだままにしている。
+省メモリモードでは、ビルド時に tools/build_dictionary_shards.py で頭文字ごとに分割した辞書と
+その目録を使い、ある頭文字の単語を初めて引いたときに、その頭文字の分だけを読み込む。
+読み込んだ分の合計が上限を超えたら、最も長く使われていないものから捨てる。
+読み込んだ分割は、dict より小さく収まる packedTable.PackedTable にして持つ。
+
+englishToKanaConverter は辞書を ``dictionaries.PHRASES`` のようにモジュール属性として参照するため、
+ShardedTable をその属性に置くだけで、変換器には手を入れずに済む。
+
+辞書を圧縮して配布する正式なビルドでは、パッケージを小さくするため分割した辞書を含めない。
+その場合は、省メモリモードを初めて使うときに、compressedDictionaries が展開した JSON から
+展開先のディレクトリの中に分割を作り、以後はそれを使う。セキュアモードでは作れないので、省メモリモードは使えない。
+"""
+
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from logHandler import log
+
+from . import compressedDictionaries
+from .packedTable import PackedTable
+
+SHARDS_DIR = os.path.join(os.path.dirname(__file__), "_dictionaryShards")
+INDEX_FILE = "index.json"
+# 表ごとの、すべての見出し語の一覧
+KEYS_FILE = "keys.json"
+# 展開した辞書から分割を作るときの、展開先の中のディレクトリ名
+DERIVED_DIR_NAME = "shards"
+
+# 分割する辞書。小さなものは分割しても効果がないので、そのまま読み込む
+TABLES = ("phrases", "words")
+
+# 使っている分割のディレクトリ
+_directory = SHARDS_DIR
+
+# 頭文字がアルファベットでない見出し語をまとめる分割の名前
+OTHERS = "_"
+
+
+def shardName(key):
+	"""見出し語 key が入る分割の名前。"""
+	initial = key[:1]
+	if "A" <= initial <= "Z":
+		return initial
+	return OTHERS
+
+
+def isAvailable():
+	"""分割した辞書がパッケージに含まれているか、展開した辞書から作れるか。"""
+	return os.path.isfile(os.path.join(SHARDS_DIR, INDEX_FILE)) or compressedDictionaries.cacheDirectory() is not None
+
+
+def loadIndex():
+	with open(os.path.join(_directory, INDEX_FILE), encoding="utf-8") as f:
+		return json.load(f)
+
+
+def write(tables, dest):
+	"""tables（ファイル名→辞書）を頭文字ごとに分割して dest に書き出し、目録を返す。
+
+	目録は最後に書くので、目録があれば分割はすべてそろっている。
+	"""
+	if os.path.isdir(dest):
+		shutil.rmtree(dest)
+	index = {"tables": {}}
+	for table, entries in tables.items():
+		shards = {}
+		for key, value in entries.items():
+			shards.setdefault(shardName(key), {})[key] = value
+		os.makedirs(os.path.join(dest, table))
+		info = {}
+		for name, shard in sorted(shards.items()):
+			path = os.path.join(dest, table, "%s.json" % name)
+			with open(path, "w", encoding="utf-8") as f:
+				json.dump(shard, f, ensure_ascii=False, separators=(",", ":"))
+			info[name] = {"count": len(shard), "bytes": os.path.getsize(path)}
+		with open(os.path.join(dest, table, KEYS_FILE), "w", encoding="utf-8") as f:
+			json.dump(sorted(entries), f, ensure_ascii=False, separators=(",", ":"))
+		index["tables"][table] = info
+	with open(os.path.join(dest, INDEX_FILE), "w", encoding="utf-8") as f:
+		json.dump(index, f, ensure_ascii=False, indent=1, sort_keys=True)
+	return index
+
+
+def _derive():
+	"""展開した辞書の JSON から、展開先のディレクトリの中に分割を作り、そのディレクトリを返す。"""
+	source = compressedDictionaries.cacheDirectory()
+	dest = os.path.join(source, DERIVED_DIR_NAME)
+	if not os.path.isfile(os.path.join(dest, INDEX_FILE)):
+		tables = {}
+		for table in TABLES:
+			with open(os.path.join(source, "%s.json" % table), encoding="utf-8") as f:
+				tables[table] = json.load(f)
+		write(tables, dest)
+		log.info("ERE: 展開した辞書から、省メモリモードで使う分割を作りました (%s)" % dest)
+	return dest
+
+
+class ShardCache:
+	"""読み込んだ分割を、すべての表でまとめて管理し、合計の大きさを上限以下に保つ。"""
+
+	def __init__(self, limit):
+		self.limit = limit
+		self._shards = OrderedDict()
+		self._sizes = {}
+		self._lock = threading.Lock()
+		self.loads = 0
+		self.evictions = 0
+
+	def get(self, table, name):
+		key = (table, name)
+		with self._lock:
+			shard = self._shards.get(key)
+			if shard is not None:
+				self._shards.move_to_end(key)
+				return shard
+		path = os.path.join(_directory, table, "%s.json" % name)
+		try:
+			with open(path, encoding="utf-8") as f:
+				shard = PackedTable(json.load(f))
+		except FileNotFoundError:
+			shard = PackedTable({})
+		with self._lock:
+			self._shards[key] = shard
+			self._sizes[key] = shard.byteSize
+			self.loads += 1
+			self._evict(key)
+		return shard
+
+	def _evict(self, keep):
+		total = sum(self._sizes.values())
+		for key in list(self._shards):
+			if total <= self.limit:
+				break
+			if key == keep:
+				continue
+			total -= self._sizes.pop(key)
+			del self._shards[key]
+			self.evictions += 1
+
+	def resident(self):
+		"""読み込まれている分割の (表, 名前, バイト数) のリスト。古い順。"""
+		with self._lock:
+			return [(table, name, self._sizes[(table, name)]) for table, name in self._shards]
+
+
+_EMPTY = PackedTable({})
+
+
+class ShardedTable(Mapping):
+	"""頭文字ごとに分割した辞書を、1つの辞書のように引けるようにする。"""
+
+	def __init__(self, table, index, cache):
+		self._table = table
+		# 分割の名前→見出し語の数
+		self._counts = index
+		self._cache = cache
+
+	def _shard(self, key):
+		name = shardName(key)
+		if name not in self._counts:
+			return _EMPTY
+		return self._cache.get(self._table, name)
+
+	def __getitem__(self, key):
+		return self._shard(key)[key]
+
+	def __contains__(self, key):
+		return isinstance(key, str) and key in self._shard(key)
+
+	def get(self, key, default=None):
+		return self._shard(key).get(key, default)
+
+	def __iter__(self):
+		# すべての分割を読み込むことになるので、変換の途中では使わないこと
+		for name in sorted(self._counts):
+			yield from list(self._cache.get(self._table, name))
+
+	def __len__(self):
+		return sum(self._counts.values())
+
+	def headwords(self):
+		"""すべての見出し語のリスト。分割は読み込まず、見出し語の一覧のファイルから読む。"""
+		try:
+			with open(os.path.join(_directory, self._table, KEYS_FILE), encoding="utf-8") as f:
+				return json.load(f)
+		except FileNotFoundError:
+			# 見出し語の一覧を書き出す前に作った分割
+			return list(self)
+
+
+_cache = None
+
+
+def load(limit):
+	"""分割した辞書を、englishToKanaConverter の属性名ごとの ShardedTable にして返す。
+
+	limit は、読み込んだままにしておく分割の合計の上限（バイト数）。
+	"""
+	global _cache, _directory
+	_directory = SHARDS_DIR if os.path.isfile(os.path.join(SHARDS_DIR, INDEX_FILE)) else _derive()
+	index = loadIndex()
+	_cache = ShardCache(limit)
+	tables = {}
+	for table, shards in index["tables"].items():
+		tables[table] = ShardedTable(table, {name: info["count"] for name, info in shards.items()}, _cache)
+	log.info("ERE: 省メモリモードで辞書を読み込みます (%s)" % ", ".join(sorted(tables)))
+	return tables
+
+
+def describe():
+	"""読み込まれている分割の一覧を、診断情報として返す。省メモリモードでなければ None。"""
+	if _cache is None:
+		return None
+	resident = _cache.resident()
+	lines = ["上限: %d KB, 使用中: %d KB, 読み込み: %d 回, 破棄: %d 回" % (
+		_cache.limit // 1024,
+		sum(size for table, name, size in resident) // 1024,
+		_cache.loads,
+		_cache.evictions,
+	)]
+	for table, name, size in resident:
+		lines.append("%s/%s: %d KB" % (table, name, size // 1024))
+	return "\n".join(lines)
@@ -11,10 +11,14 @@ NVDA を再起動することなく、その場で辞書を切り替えられる
 ディレクトリごと存在しない場合は切り替え機能自体が無効になる。
 
 辞書の更新には ``update_devDictionaries.bat`` を使う。
+
+DevDictionaryWatcher を使うと、_devDictionaries のファイルの更新日時と大きさを別のスレッドで
+定期的に確かめ、変更されたファイルだけを読み直す。NVDA を再起動しなくても、更新した辞書をすぐに試せる。
 """
 
 import json
 import os
+import threading
 
 from logHandler import log
 
@@ -34,8 +38,20 @@ _DEV_DIR = os.path.join(os.path.dirname(__file__), "_devDictionaries")
 
 # 既定の辞書。最初に切り替える直前の状態を控えておき、元に戻す際に使う
 _defaults = {}
-# 開発中の辞書。一度読み込んだら保持する
+# 開発中の辞書。一度読み込んだら保持する。読み直すときは、辞書全体を新しいものに置き換える
 _devCache = None
+# 開発中の辞書を読み込んだときの、ファイルごとの (更新日時, 大きさ)
+_devStats = {}
+# 開発中の辞書を使っているか
+_usingDev = False
+# 辞書を差し替えるたびに進める。変換結果などを辞書ごとに控えておく処理は、
+# この値が変わったら控えを捨てる
+_generation = 0
+# 読み直しと切り替えが、別々のスレッドから同時に行われないようにする
+_lock = threading.RLock()
+
+# 開発中の辞書の変更を確かめる間隔（秒）
+POLL_INTERVAL = 2.0
 
 
 def isAvailable():
@@ -58,48 +74,157 @@ def getDevDictionaryNames():
 	)
 
 
+def _stat(name):
+	stat = os.stat(os.path.join(_DEV_DIR, "%s.json" % name))
+	return (stat.st_mtime_ns, stat.st_size)
+
+
+def _readDev(name):
+	"""開発中の辞書を1つ読み込み、(辞書, 読み込む前の (更新日時, 大きさ)) を返す。"""
+	# 読んでいる間に書き換えられても、次に確かめたときに読み直されるよう、先に控える
+	stat = _stat(name)
+	with open(os.path.join(_DEV_DIR, "%s.json" % name), encoding="utf-8") as f:
+		return json.load(f), stat
+
+
 def _loadDev():
 	global _devCache
 	if _devCache is not None:
 		return _devCache
 	loaded = {}
 	for name in getDevDictionaryNames():
-		path = os.path.join(_DEV_DIR, "%s.json" % name)
-		with open(path, encoding="utf-8") as f:
-			loaded[name] = json.load(f)
+		loaded[name], _devStats[name] = _readDev(name)
 	_devCache = loaded
 	return _devCache
 
 
+def reloadChanged():
+	"""開発中の辞書のうち、前回読み込んでから変更されたファイルだけを読み直す。
+
+	開発中の辞書を使っていれば、読み直したものをすぐに使う。読み直した辞書の名前を返す。
+	"""
+	global _devCache
+	if _devCache is None:
+		# まだ読み込んでいない。使うときに最新のものが読み込まれる
+		return []
+	changed = {}
+	stats = {}
+	for name in getDevDictionaryNames():
+		try:
+			if _devStats.get(name) == _stat(name):
+				continue
+			changed[name], stats[name] = _readDev(name)
+		except (OSError, ValueError):
+			# 書き込みの途中など。次に確かめたときに読み直す
+			log.debug("ERE: could not reload %s.json yet" % name, exc_info=True)
+			changed.pop(name, None)
+	if not changed:
+		return []
+	with _lock:
+		# すべて読み終えてから、まとめて置き換える
+		_devCache = dict(_devCache, **changed)
+		_devStats.update(stats)
+		if _usingDev:
+			for name in changed:
+				if name not in _defaults:
+					_defaults[name] = getattr(dictionaries, _TARGETS[name])
+			_apply(changed)
+	log.info("ERE: 開発中の辞書を読み直しました (%s)" % ", ".join(sorted(changed)))
+	return sorted(changed)
+
+
+class DevDictionaryWatcher:
+	"""開発中の辞書の変更を、別のスレッドで定期的に確かめる。"""
+
+	def __init__(self, interval=POLL_INTERVAL):
+		self.interval = interval
+		self._stopEvent = threading.Event()
+		self._thread = None
+
+	def start(self):
+		if self._thread is not None:
+			return
+		self._stopEvent.clear()
+		self._thread = threading.Thread(target=self._run, name="ERE dev dictionary watcher", daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		if self._thread is None:
+			return
+		self._stopEvent.set()
+		self._thread.join(timeout=self.interval + 1)
+		self._thread = None
+
+	def _run(self):
+		while not self._stopEvent.wait(self.interval):
+			try:
+				reloadChanged()
+			except Exception:
+				log.exception("ERE: 開発中の辞書を読み直せませんでした")
+
+
 def _apply(source):
+	global _generation
 	for name, value in source.items():
 		setattr(dictionaries, _TARGETS[name], value)
+	_generation += 1
+
+
+def getGeneration():
+	"""現在の辞書の世代。辞書が差し替えられるたびに変わる。"""
+	return _generation
+
+
+def isUsingDev():
+	"""開発中の辞書を使っているか。"""
+	return _usingDev
 
 
 def useDev():
 	"""開発中の辞書に切り替える。切り替えた辞書の件数を返す。"""
-	dev = _loadDev()
-	if not dev:
-		raise RuntimeError("開発中の辞書が見つかりません。")
-	# 最初の切り替え時にだけ、既定の辞書を控えておく
-	for name in dev:
-		if name not in _defaults:
-			_defaults[name] = getattr(dictionaries, _TARGETS[name])
-	_apply(dev)
+	global _usingDev
+	with _lock:
+		dev = _loadDev()
+		if not dev:
+			raise RuntimeError("開発中の辞書が見つかりません。")
+		# 最初の切り替え時にだけ、既定の辞書を控えておく
+		for name in dev:
+			if name not in _defaults:
+				_defaults[name] = getattr(dictionaries, _TARGETS[name])
+		_apply(dev)
+		_usingDev = True
 	log.info("ERE: 開発中の辞書に切り替えました (%s)" % ", ".join(sorted(dev)))
 	return {name: len(value) for name, value in dev.items()}
 
 
 def useDefault():
 	"""同梱されている既定の辞書に戻す。"""
+	global _usingDev
 	if not _defaults:
 		# 一度も切り替えていないので、すでに既定の状態
 		return {}
-	_apply(_defaults)
+	with _lock:
+		_usingDev = False
+		_apply(_defaults)
 	log.info("ERE: 既定の辞書に戻しました")
 	return {name: len(value) for name, value in _defaults.items()}
 
 
+def replaceDefaults(tables):
+	"""既定の辞書を tables で置き換える。
+
+	開発中の辞書で差し替えている辞書は、既定の辞書に戻すときに tables が使われる。
+	"""
+	with _lock:
+		current = {}
+		for name, value in tables.items():
+			if name in _defaults:
+				_defaults[name] = value
+			if not (_usingDev and _devCache and name in _devCache):
+				current[name] = value
+		_apply(current)
+
+
 def describe():
 	"""現在使われている辞書の概要を、利用者に見せる文字列で返す。"""
 	return "phrases.json: %d件, words.json: %d件" % (
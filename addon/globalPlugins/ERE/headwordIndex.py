@@ -0,0 +1,210 @@
+# coding: UTF-8
+
+"""読み間違いの報告ダイアログで、入力中の単語に近い辞書の見出し語を探す。
+
+WORDS と PHRASES の見出し語を、前後に空白を付けて3文字ずつに区切り（トライグラム）、
+トライグラム→見出し語の番号の一覧という索引を、辞書の世代ごとに1回だけ作る。
+探すときは、入力した単語のトライグラムの一覧を、件数の少ないものから順に数え、
+多く重なった見出し語だけを、重なりの割合（Dice 係数）で並べ直す。
+ING のような多くの見出し語に現れるトライグラムは、数える件数が POSTING_BUDGET を超えたら数えない。
+そのため、辞書の件数が多くても、1回の検索は数ミリ秒で終わる。
+
+索引の作成と検索は Searcher のスレッドで行い、ダイアログのスレッドを止めない。
+索引は辞書と同じくらいの大きさになるので、Searcher がすべて止まったら捨て、次に開いたときに作り直す。
+省メモリモードでは、分割した辞書をすべて読み込まないよう、見出し語の一覧のファイルから索引を作る。
+"""
+
+import heapq
+import threading
+from array import array
+from collections import Counter, namedtuple
+from operator import itemgetter
+
+from logHandler import log
+
+from . import converter
+from . import dictionaryShards
+from . import dictionarySwitcher
+from ._englishToKanaConverter.englishToKanaConverter import dictionaries
+
+# 返す見出し語の数
+LIMIT = 8
+
+# 重なりの割合がこれより小さい見出し語は返さない
+MIN_SCORE = 0.3
+
+# 重なりの割合を求め直す候補の数
+CANDIDATES = 200
+
+# 1回の検索で数える、見出し語の番号の数の目安
+POSTING_BUDGET = 20000
+
+# 入力した単語を調べた結果。reading は現在の読み、registered は辞書に載っているか、
+# suggestions は (見出し語, 読み) の一覧
+Lookup = namedtuple("Lookup", ("text", "reading", "registered", "suggestions"))
+
+
+def _headwords(table):
+	if isinstance(table, dictionaryShards.ShardedTable):
+		return table.headwords()
+	return table
+
+
+def _trigrams(word):
+	padded = " %s " % word
+	return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class HeadwordIndex:
+	def __init__(self, *tables):
+		keys = set()
+		for table in tables:
+			keys.update(_headwords(table))
+		self._keys = sorted(keys)
+		self._sizes = array("i")
+		postings = {}
+		for i, key in enumerate(self._keys):
+			grams = _trigrams(key)
+			self._sizes.append(len(grams))
+			for gram in grams:
+				ids = postings.get(gram)
+				if ids is None:
+					ids = postings[gram] = array("i")
+				ids.append(i)
+		self._postings = postings
+
+	def __len__(self):
+		return len(self._keys)
+
+	def search(self, word, limit=LIMIT):
+		"""word に近い見出し語を、近いものから最大 limit 件返す。word 自身は含めない。"""
+		word = word.upper()
+		grams = _trigrams(word)
+		lists = sorted((self._postings[gram] for gram in grams if gram in self._postings), key=len)
+		counts = Counter()
+		budget = POSTING_BUDGET
+		for ids in lists:
+			# 最も件数の少ない一覧は、目安を超えても数える
+			if budget <= 0 and counts:
+				break
+			counts.update(ids)
+			budget -= len(ids)
+		scored = []
+		for i, count in heapq.nlargest(CANDIDATES, counts.items(), key=itemgetter(1)):
+			key = self._keys[i]
+			if key == word:
+				continue
+			# 数えなかったトライグラムもあるので、重なりは求め直す
+			common = len(grams & _trigrams(key))
+			score = 2 * common / (len(grams) + self._sizes[i])
+			if score >= MIN_SCORE:
+				scored.append((-score, abs(len(key) - len(word)), key))
+		return [key for score, difference, key in heapq.nsmallest(limit, scored)]
+
+
+_index = None
+_generation = None
+# 動いている Searcher の数
+_searchers = 0
+_lock = threading.Lock()
+
+
+def get():
+	"""現在の辞書の HeadwordIndex を返す。辞書が切り替えられていたら作り直す。"""
+	global _index, _generation
+	generation = dictionarySwitcher.getGeneration()
+	with _lock:
+		if _index is None or _generation != generation:
+			_index = HeadwordIndex(dictionaries.WORDS, dictionaries.PHRASES)
+			_generation = generation
+		return _index
+
+
+def _enter():
+	global _searchers
+	with _lock:
+		_searchers += 1
+
+
+def _leave():
+	"""Searcher が止まったら呼ぶ。ほかに動いているものが無ければ、索引を捨てる。"""
+	global _searchers, _index, _generation
+	with _lock:
+		_searchers -= 1
+		if not _searchers:
+			_index = _generation = None
+
+
+def _reading(key):
+	reading = dictionaries.PHRASES.get(key)
+	if reading is None:
+		reading = dictionaries.WORDS.get(key)
+	return reading
+
+
+def lookup(text, process):
+	"""text の現在の読みと、近い見出し語を調べる。process は、読みを求めるのに使う変換器の process。"""
+	key = text.upper()
+	return Lookup(
+		text,
+		process(text),
+		_reading(key) is not None,
+		[(headword, _reading(headword)) for headword in get().search(key)],
+	)
+
+
+class Searcher:
+	"""別のスレッドで lookup() を行い、結果を callback(Lookup) に渡す。
+
+	結果を待っている間に新しい文字列を渡されたら、古いものは調べない。
+	callback は Searcher のスレッドから呼ばれる。
+	変換器が複数のスレッドから同時に使えるとは限らないため、読み上げに使っているものとは別の変換器で読みを求める。
+	"""
+
+	def __init__(self, callback):
+		self._callback = callback
+		self._pending = None
+		self._stopped = False
+		self._condition = threading.Condition()
+		self._thread = threading.Thread(target=self._run, name="ERE headword searcher", daemon=True)
+		self._thread.start()
+
+	def search(self, text):
+		with self._condition:
+			self._pending = text
+			self._condition.notify()
+
+	def stop(self):
+		"""スレッドを止める。ほかに動いている Searcher が無ければ、スレッドの終わりに索引を捨てる。"""
+		with self._condition:
+			self._stopped = True
+			self._condition.notify()
+
+	def _run(self):
+		_enter()
+		try:
+			self._serve()
+		finally:
+			_leave()
+
+	def _serve(self):
+		process = converter.Converter().process
+		try:
+			# 入力を待つ間に、索引を作っておく
+			get()
+		except Exception:
+			log.error("ERE: 見出し語の索引を作れませんでした", exc_info=True)
+			return
+		while True:
+			with self._condition:
+				while self._pending is None and not self._stopped:
+					self._condition.wait()
+				if self._stopped:
+					return
+				text, self._pending = self._pending, None
+			try:
+				result = lookup(text, process)
+			except Exception:
+				log.debugWarning("ERE: failed to look up headwords", exc_info=True)
+				continue
+			self._callback(result)
@@ -0,0 +1,66 @@
+# coding: UTF-8
+
+"""ソースコードの識別子を、辞書で引ける単語に分ける。
+
+NVDA の組み込みの読み上げ辞書には、camelCase を分ける ``([a-z])([A-Z])`` などの規則があるが、
+変換した後のカナには当てはまらないため、有効にしている間は取り除いている
+（postProcessor.UNUSED_BUILTIN_PATTERNS）。そのままでは、getValueFromHTTPServer や
+max_retry_count のような識別子が1つの長い未知の単語として変換器に渡り、分けるのに時間がかかったうえ、
+たいていは1文字ずつ読まれてしまう。
+
+ここでは変換の前に、分ける必要のある識別子だけを1回の走査で見つけ、
+camelCase、HTTPServer のような略語の続き、英字と数字の境目に空白を入れ、_ を空白にする。
+APIs や OSes のような略語の複数形は、文章にもよく現れるので分けない。
+それ以外の文字は取り除かずにそのまま残す。
+分けた結果は識別子ごとに控えておく。辞書の見出し語にそのまま載っているもの（YouTube など）は分けない。
+
+強制スペルアウトモードでは、_ も含めて1文字ずつ読む必要があるため、このモジュールは使わない。
+"""
+
+import re
+from functools import lru_cache
+
+from . import dictionarySwitcher
+from ._englishToKanaConverter.englishToKanaConverter import dictionaries
+
+# 識別子ごとに控えておく分け方の数の上限
+CACHE_SIZE = 4096
+
+# 略語の複数形（APIs、URLs、OSes など）の、最後の大文字から後ろ。
+# 略語と大文字で始まる単語の境目でも、後ろがこれだけなら分けない
+_PLURAL = r"(?![A-Z]e?s(?![a-z]))"
+
+# 分ける必要のある識別子。小文字や数字の後の大文字で始まる単語、略語の後の大文字で始まる単語、
+# 英字に接した _ のいずれかを含むものだけに当てはまる。
+# x64 や mp3、2nd のような、英字と数字だけでできたものは分けない。
+# 日本語の文字に続く識別子も見つけられるよう、\b は ASCII の英数字と _ だけを単語の文字として扱う
+_IDENTIFIER = re.compile(
+	r"\b(?=\w*?(?:[a-z][A-Z]|[A-Z0-9]" + _PLURAL + r"[A-Z][a-z]|[A-Za-z]_|_[A-Za-z]))\w+\b",
+	re.ASCII,
+)
+
+# 識別子の中で空白を入れる位置。HTTPServer は HTTP と Server の間、getValue は get と Value の間、
+# 英字と数字の間
+_BOUNDARY = re.compile(r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])" + _PLURAL + r"|(?<=[A-Za-z])(?=[0-9])|(?<=[0-9])(?=[A-Za-z])")
+
+
+def _isHeadword(word):
+	key = word.upper()
+	return key in dictionaries.WORDS or key in dictionaries.PHRASES
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _splitIdentifier(identifier, generation):
+	# generation は、辞書が切り替えられたときに控えを使わないようにするためだけに受け取る
+	if _isHeadword(identifier):
+		return identifier
+	return _BOUNDARY.sub(" ", identifier).replace("_", " ")
+
+
+def _replace(match):
+	return _splitIdentifier(match.group(), dictionarySwitcher.getGeneration())
+
+
+def split(text):
+	"""text に含まれる識別子を、空白で区切った単語にして返す。通常のモード（ConversionMode.STANDARD）でだけ使う。"""
+	return _IDENTIFIER.sub(_replace, text)
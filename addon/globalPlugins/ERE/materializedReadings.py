@@ -0,0 +1,116 @@
+# coding: UTF-8
+
+"""よく使われる単語の、ビルド時に変換しておいた読み。
+
+「the」「file」「error」「settings」のような単語は、単語単位で読み上げたときや、
+メニュー項目・ボタンの名前として、何度も単独で読み上げられる。
+tools/build_materialized_readings.py で、よく使われる単語の一覧を通常のモードで変換し、
+文字列→読みの表として書き出しておく。実行時は、変換の前にこの表を1回引き、見つかればそのまま使う。
+表は起動のたびに読み込むので、一覧の単語（数千語まで）だけに抑えている。
+
+変換結果は辞書と変換器に依存するため、表には作成時の辞書と変換器の指紋を付けておく。
+読み込むときに指紋が合わなければ、表は使わない。また、開発中の辞書に切り替えている間も使わない。
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from logHandler import log
+
+from . import compressedDictionaries
+from . import dictionarySwitcher
+from .packedTable import PackedTable
+
+READINGS_FILE = os.path.join(os.path.dirname(__file__), "_materializedReadings.json")
+CONVERTER_DIR = os.path.join(os.path.dirname(__file__), "_englishToKanaConverter", "englishToKanaConverter")
+
+# 指紋の計算に含めるファイルの拡張子
+_FINGERPRINT_EXTENSIONS = (".py", ".json")
+
+
+def fingerprint(directory=CONVERTER_DIR):
+	"""変換器のソースと辞書の内容から求めた指紋。
+
+	辞書を圧縮してパッケージに含めた場合は、元の JSON の代わりに、目録にある元の JSON の sha1 を使う。
+	そのため、ビルド時と実行時とで同じ指紋になる。
+	"""
+	hashes = {}
+	for current, dirs, files in os.walk(directory):
+		dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+		for name in files:
+			if name.endswith(_FINGERPRINT_EXTENSIONS):
+				path = os.path.join(current, name)
+				with open(path, "rb") as f:
+					hashes[os.path.relpath(path, directory).replace(os.sep, "/")] = hashlib.sha1(f.read()).hexdigest()
+	if directory == CONVERTER_DIR:
+		for path, sha1 in compressedDictionaries.originalHashes().items():
+			hashes.setdefault(path, sha1)
+	digest = hashlib.sha1()
+	for path, sha1 in sorted(hashes.items()):
+		digest.update(("%s\0%s\0" % (path, sha1)).encode("utf-8"))
+	return digest.hexdigest()
+
+
+class MaterializedReadings:
+	def __init__(self):
+		# ConversionMode の名前→PackedTable。読み込むまでと、使えない場合は None
+		self._tables = None
+		self._loading = False
+		self._lock = threading.Lock()
+		self.hits = 0
+
+	def load(self, path=READINGS_FILE):
+		"""表を別のスレッドで読み込む。読み込み終わるまでは、何も見つからないものとして扱う。"""
+		with self._lock:
+			if self._loading or self._tables is not None:
+				return
+			self._loading = True
+		threading.Thread(target=self._load, args=(path,), name="ERE materialized readings", daemon=True).start()
+
+	def _load(self, path):
+		tables = None
+		try:
+			with open(path, encoding="utf-8") as f:
+				data = json.load(f)
+			if data.get("fingerprint") != fingerprint():
+				log.info("ERE: 変換済みの読みの表が、現在の辞書と一致しないため使いません")
+			else:
+				tables = {mode: PackedTable(readings) for mode, readings in data["readings"].items()}
+				log.debug("ERE: loaded materialized readings (%s)" % ", ".join(
+					"%s: %d" % (mode, len(table)) for mode, table in sorted(tables.items())
+				))
+		except FileNotFoundError:
+			pass
+		except Exception:
+			log.exception("ERE: 変換済みの読みの表を読み込めませんでした")
+		with self._lock:
+			self._tables = tables
+			self._loading = False
+
+	def lookup(self, text, mode):
+		"""text 全体の変換済みの読みを返す。無ければ None。"""
+		tables = self._tables
+		if tables is None or dictionarySwitcher.isUsingDev():
+			return None
+		table = tables.get(mode.name)
+		if table is None:
+			return None
+		reading = table.get(text)
+		if reading is not None:
+			self.hits += 1
+		return reading
+
+	def describe(self):
+		tables = self._tables
+		if tables is None:
+			return "読み込まれていません"
+		return "%s, 使用: %d 回" % (
+			", ".join("%s: %d件" % (mode, len(table)) for mode, table in sorted(tables.items())),
+			self.hits,
+		)
+
+
+# プロセス全体で1つだけ使う
+readings = MaterializedReadings()
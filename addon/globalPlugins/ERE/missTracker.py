@@ -0,0 +1,124 @@
+# coding: UTF-8
+
+"""辞書に見出し語として登録されていない英単語を数え、辞書の整備に役立てる。
+
+読み上げのたびに全単語を記録するとメモリを使い続けてしまうため、
+Space-Saving 法で上位の単語だけを保持する。保持する単語の数には上限があり、
+1単語あたりの処理は、保持している単語の数によらず一定の手間で終わる。
+
+上限を超えて新しい単語が現れたときは、最も少ない回数の単語と入れ替え、
+その回数を引き継ぐ。そのため回数は多めに出ることがあるが、
+本当に頻繁に現れる単語が漏れることはない。引き継いだ分は ``error`` として控えておく。
+
+集計結果はこのコンピューターの中でだけ扱い、ネットワークには一切送らない。
+"""
+
+import re
+import threading
+
+from ._englishToKanaConverter.englishToKanaConverter import dictionaries
+
+# 保持する単語の数の上限
+DEFAULT_CAPACITY = 500
+
+# これより長いものは、単語ではなく識別子や記号列と見なして数えない
+MAX_WORD_LENGTH = 40
+
+# camelCase などは大文字の位置で区切る。1文字はスペルアウトされるだけなので数えない
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+
+
+class MissTracker:
+	def __init__(self, capacity=DEFAULT_CAPACITY):
+		self._capacity = capacity
+		self._lock = threading.Lock()
+		self.clear()
+
+	def clear(self):
+		with self._lock:
+			# 単語→回数
+			self._counts = {}
+			# 単語→入れ替え時に引き継いだ回数
+			self._errors = {}
+			# 回数→その回数の単語の集合。最小の回数の単語をすぐに見つけるために使う
+			self._buckets = {}
+			self._min = 0
+			self.total = 0
+
+	def feed(self, text):
+		"""読み上げる文字列から、辞書に無い単語を拾って数える。"""
+		phrases = dictionaries.PHRASES
+		words = dictionaries.WORDS
+		for m in _WORD.finditer(text):
+			word = m.group()
+			if len(word) < 2 or len(word) > MAX_WORD_LENGTH:
+				continue
+			word = word.upper()
+			if word in words or word in phrases:
+				continue
+			self.add(word)
+
+	def add(self, word):
+		with self._lock:
+			self.total += 1
+			counts = self._counts
+			count = counts.get(word)
+			if count is not None:
+				self._move(word, count, count + 1)
+				return
+			if len(counts) < self._capacity:
+				self._errors[word] = 0
+				self._put(word, 1)
+				self._min = 1
+				return
+			# 最も少ない回数の単語を追い出し、その回数を引き継ぐ
+			victim = self._buckets[self._min].pop()
+			count = counts.pop(victim)
+			del self._errors[victim]
+			if not self._buckets[count]:
+				del self._buckets[count]
+			self._errors[word] = count
+			self._put(word, count + 1)
+			if count not in self._buckets:
+				self._min = count + 1
+
+	def _put(self, word, count):
+		self._counts[word] = count
+		bucket = self._buckets.get(count)
+		if bucket is None:
+			bucket = self._buckets[count] = set()
+		bucket.add(word)
+
+	def _move(self, word, old, new):
+		bucket = self._buckets[old]
+		bucket.discard(word)
+		if not bucket:
+			del self._buckets[old]
+			if self._min == old:
+				self._min = new
+		self._put(word, new)
+
+	def __len__(self):
+		return len(self._counts)
+
+	def top(self, limit=None):
+		"""回数の多い順に、(単語, 回数, 誤差) のリストを返す。"""
+		with self._lock:
+			items = [(word, count, self._errors[word]) for word, count in self._counts.items()]
+		items.sort(key=lambda item: (-item[1], item[0]))
+		if limit is not None:
+			items = items[:limit]
+		return items
+
+	def export(self, path, limit=None):
+		"""集計結果をタブ区切りのテキストファイルに書き出す。書き出した件数を返す。"""
+		items = self.top(limit)
+		with open(path, "w", encoding="utf-8", newline="\n") as f:
+			f.write("# word\tcount\terror\n")
+			for word, count, error in items:
+				f.write("%s\t%d\t%d\n" % (word, count, error))
+		return len(items)
+
+
+# プロセス全体で1つだけ使う
+tracker = MissTracker()
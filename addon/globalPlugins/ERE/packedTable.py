@@ -0,0 +1,108 @@
+# coding: UTF-8
+
+"""辞書の見出し語と読みを、1つのバイト列にまとめて持つ読み取り専用の表。
+
+5万件近い見出し語と読みを、それぞれ Python の str として dict に入れておくと、
+文字列ごとのオブジェクトの見出しと、ハッシュ表の空き領域とで、UTF-8 のままの大きさの
+何倍ものメモリを使う。
+
+PackedTable では、すべての見出し語と読みを UTF-8 で1つの bytes につなげ、
+それぞれの開始位置を array に、見出し語のハッシュ値を別の array に持つ。
+引くときは、オープンアドレス法のハッシュ表で位置を探し、読みをその場で str に戻す。
+dict より1回の検索は遅くなるが、englishToKanaConverter が使う Mapping の操作はすべてできる。
+
+ハッシュ値には hash() を使うため、表は実行中に作るものとし、ファイルには保存しない。
+"""
+
+from array import array
+from collections.abc import Mapping
+
+
+class PackedTable(Mapping):
+	def __init__(self, source):
+		items = list(source.items())
+		size = 8
+		while size < len(items) * 2:
+			size *= 2
+		self._mask = size - 1
+		# 見出し語 i は offsets[2i]〜offsets[2i+1]、読み i は offsets[2i+1]〜offsets[2i+2]
+		offsets = array("I")
+		hashes = array("q")
+		slots = array("i", [-1]) * size
+		buffer = bytearray()
+		for i, (key, value) in enumerate(items):
+			offsets.append(len(buffer))
+			buffer += key.encode("utf-8")
+			offsets.append(len(buffer))
+			buffer += value.encode("utf-8")
+			h = hash(key)
+			hashes.append(h)
+			slot = h & self._mask
+			while slots[slot] >= 0:
+				slot = (slot + 1) & self._mask
+			slots[slot] = i
+		offsets.append(len(buffer))
+		self._buffer = bytes(buffer)
+		self._offsets = offsets
+		self._hashes = hashes
+		self._slots = slots
+
+	def _find(self, key):
+		"""key の番号を返す。無ければ -1。"""
+		if not isinstance(key, str):
+			return -1
+		h = hash(key)
+		mask = self._mask
+		slots = self._slots
+		hashes = self._hashes
+		slot = h & mask
+		encoded = None
+		while True:
+			i = slots[slot]
+			if i < 0:
+				return -1
+			if hashes[i] == h:
+				if encoded is None:
+					encoded = key.encode("utf-8")
+				offsets = self._offsets
+				if self._buffer[offsets[2 * i]:offsets[2 * i + 1]] == encoded:
+					return i
+			slot = (slot + 1) & mask
+
+	def _value(self, i):
+		offsets = self._offsets
+		return self._buffer[offsets[2 * i + 1]:offsets[2 * i + 2]].decode("utf-8")
+
+	def __getitem__(self, key):
+		i = self._find(key)
+		if i < 0:
+			raise KeyError(key)
+		return self._value(i)
+
+	def __contains__(self, key):
+		return self._find(key) >= 0
+
+	def get(self, key, default=None):
+		i = self._find(key)
+		if i < 0:
+			return default
+		return self._value(i)
+
+	def __iter__(self):
+		offsets = self._offsets
+		buffer = self._buffer
+		for i in range(len(self._hashes)):
+			yield buffer[offsets[2 * i]:offsets[2 * i + 1]].decode("utf-8")
+
+	def __len__(self):
+		return len(self._hashes)
+
+	@property
+	def byteSize(self):
+		"""この表が使うおおよそのバイト数。"""
+		return (
+			len(self._buffer)
+			+ self._offsets.itemsize * len(self._offsets)
+			+ self._hashes.itemsize * len(self._hashes)
+			+ self._slots.itemsize * len(self._slots)
+		)
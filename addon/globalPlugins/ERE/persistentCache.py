@@ -0,0 +1,219 @@
+# coding: UTF-8
+
+"""NVDA を再起動しても残る、変換結果の控え。
+
+同じアプリケーションで短い時間だけ NVDA を使う場合、メモリ上の控えは再起動のたびに失われ、
+同じメニュー項目や画面の文字列を、起動するたびに変換し直すことになる。
+ここでは、変換結果を NVDA の設定ディレクトリのファイルに追記していき、次回の起動時に読み込む。
+
+* ファイルの1行目には、変換結果を左右するものの指紋（fingerprint()）を書く。
+  辞書と変換器のほか、addressReader や identifierSplitter などアドオン自身の前処理も結果を変えるので、
+  アドオンの版と、前処理の設定（maxAddressLength）も含める。
+  指紋が合わなければ、ファイルの内容は捨てて作り直す。
+* 2行目以降は、1行に1件、[変換モードの名前, 文字列, 読み] の JSON を追記する。
+* 読み込みと書き込みは、どちらも別のスレッドで行い、読み上げの処理では行わない。
+  書き込みは、いくつかの件数をまとめて行う。
+* 件数には上限があり、超えた分は最も長く使われていないものから捨てる。
+  ファイルの行数が上限の2倍を超えたときと、終了時に、メモリ上の控えでファイルを書き直す。
+
+開発中の辞書に切り替えている間は使わない。
+"""
+
+import hashlib
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from logHandler import log
+
+from . import addressReader
+from . import dictionarySwitcher
+from . import materializedReadings
+
+# NVDA の設定ディレクトリに置くファイルの名前
+FILE_NAME = "ERE_conversionCache.jsonl"
+# 保持する件数の上限
+MAX_ENTRIES = 5000
+# これより長い文字列は控えない
+MAX_TEXT_LENGTH = 500
+# 書き込みをまとめるまでに待つ秒数
+FLUSH_INTERVAL = 5.0
+# 1回にまとめて書き込む件数の上限。これだけたまったら待たずに書き込む
+BATCH_SIZE = 100
+
+_STOP = object()
+
+
+def fingerprint():
+	"""辞書と変換器の指紋に、アドオンの版と前処理の設定を加えた指紋。"""
+	from .constants import addonVersion
+	digest = hashlib.sha1()
+	for part in (materializedReadings.fingerprint(), addonVersion, "maxAddressLength=%d" % addressReader.maxLength):
+		digest.update(("%s\0" % part).encode("utf-8"))
+	return digest.hexdigest()
+
+
+class PersistentCache:
+	def __init__(self, path, maxEntries=MAX_ENTRIES):
+		self.path = path
+		self.maxEntries = maxEntries
+		# (変換モードの名前, 文字列)→読み。古い順
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+		self._queue = queue.Queue()
+		self._ready = False
+		self._fingerprint = None
+		# ファイルの行数（指紋の行を除く）
+		self._lines = 0
+		# 前回書き直してから、読み込んだ控えが使われたり、捨てられたりしたか
+		self._dirty = False
+		self._thread = None
+		self.hits = 0
+
+	def start(self):
+		"""別のスレッドでファイルを読み込み、その後は書き込みを待つ。"""
+		if self._thread is not None:
+			return
+		self._thread = threading.Thread(target=self._run, name="ERE persistent cache", daemon=True)
+		self._thread.start()
+
+	def stop(self, remove=False):
+		"""書き込みを終え、必要ならファイルを書き直してから、スレッドを止める。
+
+		remove が True なら、最後にファイルを削除する。
+		"""
+		if self._thread is not None:
+			self._queue.put(_STOP)
+			self._thread.join(timeout=10)
+			self._thread = None
+		self._ready = False
+		if remove:
+			try:
+				os.remove(self.path)
+			except FileNotFoundError:
+				pass
+			except OSError:
+				log.exception("ERE: 変換結果の控えを削除できませんでした")
+
+	def get(self, text, mode):
+		if not self._ready or dictionarySwitcher.isUsingDev():
+			return None
+		key = (mode.name, text)
+		with self._lock:
+			reading = self._entries.get(key)
+			if reading is None:
+				return None
+			self._entries.move_to_end(key)
+			self._dirty = True
+		self.hits += 1
+		return reading
+
+	def put(self, text, mode, reading):
+		if not self._ready or len(text) > MAX_TEXT_LENGTH or dictionarySwitcher.isUsingDev():
+			return
+		key = (mode.name, text)
+		with self._lock:
+			if self._entries.get(key) == reading:
+				return
+			self._entries[key] = reading
+			self._entries.move_to_end(key)
+			self._evict()
+		self._queue.put(key + (reading,))
+
+	def _evict(self):
+		while len(self._entries) > self.maxEntries:
+			self._entries.popitem(last=False)
+			self._dirty = True
+
+	def _run(self):
+		try:
+			self._load()
+		except Exception:
+			log.exception("ERE: 変換結果の控えを読み込めませんでした")
+			return
+		self._ready = True
+		pending = []
+		while True:
+			try:
+				item = self._queue.get(timeout=FLUSH_INTERVAL if pending else None)
+			except queue.Empty:
+				item = False
+			if item is _STOP:
+				self._flush(pending)
+				if self._dirty:
+					self._compact()
+				return
+			if item is not False:
+				pending.append(item)
+				if len(pending) < BATCH_SIZE:
+					continue
+			self._flush(pending)
+			pending = []
+
+	def _load(self):
+		self._fingerprint = fingerprint()
+		entries = OrderedDict()
+		lines = 0
+		try:
+			with open(self.path, encoding="utf-8") as f:
+				header = json.loads(f.readline() or "null")
+				if not isinstance(header, dict) or header.get("fingerprint") != self._fingerprint:
+					log.info("ERE: 辞書、アドオン、または設定が変わったため、変換結果の控えを作り直します")
+				else:
+					for line in f:
+						try:
+							mode, text, reading = json.loads(line)
+						except ValueError:
+							# 書き込みの途中で終了した行
+							continue
+						key = (mode, text)
+						entries[key] = reading
+						entries.move_to_end(key)
+						lines += 1
+		except FileNotFoundError:
+			pass
+		with self._lock:
+			self._entries = entries
+			self._evict()
+		self._lines = lines
+		if not lines:
+			self._compact()
+		log.debug("ERE: loaded %d persistent cache entries" % len(entries))
+
+	def _flush(self, pending):
+		if not pending:
+			return
+		try:
+			with open(self.path, "a", encoding="utf-8") as f:
+				for record in pending:
+					f.write(json.dumps(record, ensure_ascii=False) + "\n")
+		except OSError:
+			log.exception("ERE: 変換結果の控えを書き込めませんでした")
+			return
+		self._lines += len(pending)
+		if self._lines > self.maxEntries * 2:
+			self._compact()
+
+	def _compact(self):
+		"""メモリ上の控えで、ファイルを書き直す。"""
+		with self._lock:
+			records = [key + (reading,) for key, reading in self._entries.items()]
+			self._dirty = False
+		temp = self.path + ".tmp"
+		try:
+			with open(temp, "w", encoding="utf-8") as f:
+				f.write(json.dumps({"fingerprint": self._fingerprint}) + "\n")
+				for record in records:
+					f.write(json.dumps(record, ensure_ascii=False) + "\n")
+			os.replace(temp, self.path)
+		except OSError:
+			log.exception("ERE: 変換結果の控えを書き直せませんでした")
+			return
+		self._lines = len(records)
+
+	def describe(self):
+		if not self._ready:
+			return "読み込まれていません"
+		return "%d 件, 使用: %d 回" % (len(self._entries), self.hits)
@@ -0,0 +1,129 @@
+# coding: UTF-8
+
+"""日本語の読み上げで、組み込みの読み上げ辞書を1回の走査で適用する。
+
+本アドオンが変換した後の文字列は、ほとんどがカタカナになっている。
+それでも processText_original は、組み込みの読み上げ辞書の項目を1つずつ re.sub で
+適用するため、項目の数だけ文字列を走査することになる。
+
+ここでは、連続する項目のパターンを1つの選択（|）にまとめてコンパイルしておき、
+まず1回だけ走査する。どの項目にも当てはまらなければ、それで処理を終える。
+何らかの項目に当てはまる場合だけ、元と同じく項目を順番に適用する。
+項目は前の項目の置換結果に対して適用されるため、1回の走査で置換まで済ませると
+結果が変わることがある。当てはまらないことの確認にだけ使えば、結果は元と必ず一致する。
+
+後方参照や名前付きグループを含むパターンは、まとめると意味が変わるため、単独で適用する。
+まとめた走査を使うのは、本アドオンが日本語の文字列を処理している間だけで、
+それ以外の言語の読み上げでは元の処理をそのまま使う。読み上げの列ごとに変換する場合（sequenceFilter）も、
+日本語の processText の間は同じようにまとめた走査を使う。
+"""
+
+import re
+import threading
+
+import speechDictHandler
+
+# 本アドオンが代わりに処理するため、組み込みの読み上げ辞書から取り除くパターン
+UNUSED_BUILTIN_PATTERNS = (
+	"([a-z])([A-Z])",
+	"([A-Z])([A-Z][a-z])",
+)
+
+# まとめられないパターン。後方参照や名前付きグループは、まとめるとグループの番号や名前がずれる
+_UNFUSABLE = re.compile(r"\\[1-9]|\(\?P[<=]|\\g<")
+
+_state = threading.local()
+
+
+class japanese:
+	"""with 文の中でだけ、まとめた走査を使う。"""
+
+	def __enter__(self):
+		_state.active = True
+
+	def __exit__(self, *exc):
+		_state.active = False
+
+
+def isActive():
+	return getattr(_state, "active", False)
+
+
+def _fusable(entry):
+	pattern = entry.compiled.pattern
+	if _UNFUSABLE.search(pattern):
+		return None
+	if entry.compiled.flags & ~(re.IGNORECASE | re.UNICODE):
+		return None
+	flags = "i" if entry.compiled.flags & re.IGNORECASE else ""
+	if flags:
+		pattern = "(?%s:%s)" % (flags, pattern)
+	else:
+		pattern = "(?:%s)" % pattern
+	try:
+		re.compile(pattern)
+	except re.error:
+		return None
+	return pattern
+
+
+def compileRuns(entries):
+	"""項目を、まとめて走査できる連続した項目ごとに分ける。
+
+	(まとめたパターン, 項目のリスト) のリストを返す。まとめられない項目は、
+	パターンを None として1件ずつの組にする。
+	"""
+	runs = []
+	patterns = []
+	members = []
+	for entry in entries:
+		pattern = _fusable(entry)
+		if pattern is None:
+			if members:
+				runs.append((re.compile("|".join(patterns)), members))
+				patterns = []
+				members = []
+			runs.append((None, [entry]))
+			continue
+		patterns.append(pattern)
+		members.append(entry)
+	if members:
+		runs.append((re.compile("|".join(patterns)), members))
+	return runs
+
+
+def applyRuns(runs, text):
+	for gate, members in runs:
+		if gate is not None and gate.search(text) is None:
+			# どの項目も当てはまらないので、順番に適用しても文字列は変わらない
+			continue
+		for entry in members:
+			text = entry.sub(text)
+	return text
+
+
+class FusedSpeechDict(speechDictHandler.SpeechDict):
+	"""組み込みの読み上げ辞書の代わりに使う。日本語の処理中だけ、まとめた走査を使う。"""
+
+	def __init__(self, entries=()):
+		super(FusedSpeechDict, self).__init__()
+		self.extend(entries)
+		self.recompile()
+
+	def recompile(self):
+		self._runs = compileRuns(self)
+		self._length = len(self)
+
+	def sub(self, text):
+		if not isActive():
+			return super(FusedSpeechDict, self).sub(text)
+		if self._length != len(self):
+			# 項目が追加・削除された
+			self.recompile()
+		try:
+			return applyRuns(self._runs, text)
+		except re.error:
+			# 置換できない項目がある。元の処理に任せて取り除かせる
+			text = super(FusedSpeechDict, self).sub(text)
+			self.recompile()
+			return text
@@ -0,0 +1,218 @@
+# coding: UTF-8
+
+"""すべて読み上げの間、この先で読み上げる部分をあらかじめ別のスレッドで変換しておく。
+
+すべて読み上げでは、NVDA は行や文の単位で順番に読み進めるため、次に読む部分が予測できる。
+読み上げ中の位置から数単位先までの文字列を取り出してバックグラウンドで変換し、
+(辞書の世代, 変換モード, 文字列) の組をキーにして控えておく。
+変換と音声合成が並行して進むので、英語の多い文書でも行の間に待ち時間ができにくくなる。
+
+すべて読み上げでは、取り出した単位の文字列がそのまま processText に渡るとは限らない。
+書式の変わり目で分かれたり、前後の単位と文の切れ目でつなぎ直されたりする。
+そこで、文の切れ目で区切った文ごとに控え、processText に渡った文字列も同じように区切って、
+すべての文が控えにあれば、それをつないで返す。
+
+TextInfo の操作はメインスレッドでしか行えないため、先の文字列を取り出す処理は
+processText の中で行い、変換だけを別のスレッドに任せる。processText は同じ位置で何度も呼ばれるので、
+取り出すのは読み上げ中の位置が進んだときだけとし、前回取り出した続きから1単位ずつ取り出す。
+変換器が複数のスレッドから同時に使えるとは限らないため、別のスレッドでは専用の変換器を使う。
+"""
+
+import queue
+import re
+import threading
+from collections import OrderedDict
+
+import textInfos
+from logHandler import log
+
+from . import converter
+from . import dictionarySwitcher
+
+# 読み上げ中の位置から、何単位先まで変換しておくか
+LOOKAHEAD = 3
+
+# 控えておく変換結果の数の上限
+CACHE_SIZE = 1024
+
+# 文の切れ目。区切りの文字列もそのまま残すため、グループで囲む
+_SENTENCE_BREAK = re.compile(r"((?<=[.!?。！？])\s+|\s*\n\s*)")
+
+
+def _sentences(text):
+	"""text を文に区切り、(前の空白, 文, 後ろの空白) と区切りの文字列を交互に返す。"""
+	for i, part in enumerate(_SENTENCE_BREAK.split(text)):
+		if i % 2:
+			yield part
+			continue
+		core = part.strip()
+		if not core:
+			yield part
+			continue
+		start = part.index(core)
+		yield (part[:start], core, part[start + len(core):])
+
+
+class ConversionCache:
+	"""変換結果を、古いものから捨てながら控えておく。"""
+
+	def __init__(self, size=CACHE_SIZE):
+		self._size = size
+		self._items = OrderedDict()
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def makeKey(text, mode):
+		return (dictionarySwitcher.getGeneration(), mode, text)
+
+	def get(self, key):
+		with self._lock:
+			value = self._items.get(key)
+			if value is not None:
+				self._items.move_to_end(key)
+			return value
+
+	def put(self, key, value):
+		with self._lock:
+			self._items[key] = value
+			self._items.move_to_end(key)
+			while len(self._items) > self._size:
+				self._items.popitem(last=False)
+
+	def __contains__(self, key):
+		with self._lock:
+			return key in self._items
+
+	def clear(self):
+		with self._lock:
+			self._items.clear()
+
+
+def _getSayAllReader():
+	"""実行中のすべて読み上げが使っている TextInfo を返す。実行中でなければ None。"""
+	try:
+		from speech.sayAll import SayAllHandler
+		active = SayAllHandler._getActiveSayAll()
+	except (ImportError, AttributeError):
+		# NVDA 2021.1 より前
+		try:
+			import sayAllHandler
+			active = sayAllHandler._activeSayAll()
+		except (ImportError, AttributeError):
+			return None
+	if active is None:
+		return None
+	# オブジェクト単位のすべて読み上げには TextInfo が無い
+	return getattr(active, "reader", None)
+
+
+class Prefetcher:
+	def __init__(self, lookahead=LOOKAHEAD):
+		self._lookahead = lookahead
+		self.cache = ConversionCache()
+		self._queue = queue.Queue()
+		# 変換待ちのキー。同じ文字列を何度も積まないようにする
+		self._pending = set()
+		self._pendingLock = threading.Lock()
+		self._thread = None
+		# 前回先を取り出したときの、読み上げ中の位置
+		self._position = None
+		# 前回取り出した部分の末尾。次はここから取り出す
+		self._ahead = None
+
+	def get(self, text, mode):
+		"""先に変換しておいた結果を返す。1文でも控えに無ければ None。"""
+		converted = []
+		for item in _sentences(text):
+			if isinstance(item, str):
+				converted.append(item)
+				continue
+			before, core, after = item
+			value = self.cache.get(ConversionCache.makeKey(core, mode))
+			if value is None:
+				return None
+			converted.append(before + value + after)
+		return "".join(converted)
+
+	def lookAhead(self, mode):
+		"""すべて読み上げの実行中で、読み上げ中の位置が進んでいれば、この先の部分を変換待ちに積む。メインスレッドから呼ぶ。"""
+		reader = _getSayAllReader()
+		if reader is None:
+			self._position = self._ahead = None
+			return
+		try:
+			position = reader.bookmark
+			if position == self._position:
+				return
+			self._position = position
+			texts = self._readAhead(reader)
+		except Exception:
+			# 文書の種類によっては先へ進めないことがある。読み上げ自体には影響させない
+			log.debugWarning("ERE: failed to read ahead", exc_info=True)
+			self._ahead = None
+			return
+		for text in texts:
+			for item in _sentences(text):
+				if isinstance(item, str):
+					continue
+				key = ConversionCache.makeKey(item[1], mode)
+				if key in self.cache:
+					continue
+				with self._pendingLock:
+					if key in self._pending:
+						continue
+					self._pending.add(key)
+				self._queue.put(key)
+		self._ensureThread()
+
+	def _readAhead(self, reader):
+		if self._ahead is not None and self._ahead.compareEndPoints(reader, "startToEnd") >= 0:
+			# 前回取り出した部分がまだ先にある。その続きを1単位だけ取り出す
+			info = self._ahead
+			count = 1
+		else:
+			# 最初の呼び出しか、前回取り出した部分より先へ移動した
+			info = reader.copy()
+			info.collapse(end=True)
+			count = self._lookahead
+		texts = []
+		for i in range(count):
+			info.expand(textInfos.UNIT_READINGCHUNK)
+			text = info.text
+			if not text:
+				break
+			texts.append(text)
+			info.collapse(end=True)
+		self._ahead = info
+		return texts
+
+	def _ensureThread(self):
+		if self._thread is not None and self._thread.is_alive():
+			return
+		self._thread = threading.Thread(target=self._run, name="ERE prefetcher", daemon=True)
+		self._thread.start()
+
+	def _run(self):
+		# 読み上げに使っている変換器とは別に作る
+		process = converter.Converter().process
+		while True:
+			key = self._queue.get()
+			if key is None:
+				return
+			generation, mode, text = key
+			try:
+				# 積んでから辞書が切り替えられていれば、変換しても使われない
+				if generation == dictionarySwitcher.getGeneration():
+					self.cache.put(key, process(text, mode=mode))
+			except Exception:
+				log.debugWarning("ERE: prefetch failed", exc_info=True)
+			finally:
+				with self._pendingLock:
+					self._pending.discard(key)
+
+	def stop(self):
+		if self._thread is not None and self._thread.is_alive():
+			self._queue.put(None)
+		self._thread = None
+		self._position = self._ahead = None
+		self.cache.clear()
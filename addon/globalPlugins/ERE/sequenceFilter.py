@@ -0,0 +1,80 @@
+# coding: UTF-8
+
+"""speech.processText を置き換える代わりに、NVDA の filter_speechSequence を使って変換する。
+
+processText は文字列を1つずつ受け取るため、名前、役割、値などに分かれた読み上げでは、
+その数だけ変換を呼ぶことになる。また、[サポートされている場合自動的に言語を切り替える]が
+有効だと、processText に渡される言語と実際に読み上げる言語とが食い違うことがあった。
+
+ここでは読み上げの列全体を受け取り、LangChangeCommand をたどって日本語で読み上げる
+文字列だけを集め、まとめて1回で変換する。filter_speechSequence は比較的新しい NVDA にしか無いため、
+使えない場合は従来通り processText を置き換えて変換する。
+使える場合も processText は置き換えるが、変換はせず、日本語の読み上げで組み込みの読み上げ辞書を
+1回の走査で適用する（postProcessor）ためだけに使う。
+"""
+
+import config
+import speech
+from logHandler import log
+
+try:
+	from speech.commands import LangChangeCommand
+except ImportError:
+	from speech import LangChangeCommand
+
+
+def isAvailable():
+	"""この NVDA で filter_speechSequence を使えるか。"""
+	try:
+		from speech.extensions import filter_speechSequence
+	except ImportError:
+		return False
+	return True
+
+
+def _getCurrentLanguage():
+	if hasattr(speech, "speech"):
+		return speech.speech.getCurrentLanguage()
+	return speech.getCurrentLanguage()
+
+
+class SequenceFilter:
+	def __init__(self, convertMany):
+		# convertMany(texts) で、texts を変換したリストを返す関数
+		self._convertMany = convertMany
+
+	def register(self):
+		from speech.extensions import filter_speechSequence
+		filter_speechSequence.register(self.filter)
+
+	def unregister(self):
+		from speech.extensions import filter_speechSequence
+		filter_speechSequence.unregister(self.filter)
+
+	def filter(self, speechSequence, **kwargs):
+		indexes = self.findJapaneseStrings(speechSequence)
+		if not indexes:
+			return speechSequence
+		try:
+			converted = self._convertMany([speechSequence[i] for i in indexes])
+		except Exception:
+			# 変換できなくても、読み上げ自体は止めない
+			log.exception("ERE: failed to convert a speech sequence")
+			return speechSequence
+		speechSequence = list(speechSequence)
+		for i, text in zip(indexes, converted):
+			speechSequence[i] = text
+		return speechSequence
+
+	def findJapaneseStrings(self, speechSequence):
+		"""日本語で読み上げられる文字列の位置を返す。言語の決め方は speech.speak と同じにする。"""
+		defaultLanguage = curLanguage = _getCurrentLanguage()
+		autoLanguageSwitching = config.conf["speech"]["autoLanguageSwitching"]
+		indexes = []
+		for i, item in enumerate(speechSequence):
+			if isinstance(item, LangChangeCommand):
+				if autoLanguageSwitching:
+					curLanguage = item.lang or defaultLanguage
+			elif isinstance(item, str) and item and curLanguage.startswith("ja"):
+				indexes.append(i)
+		return indexes
@@ -0,0 +1,120 @@
+# coding: UTF-8
+
+"""強制スペルアウトモードの変換を、str.translate の1回の呼び出しで行う。
+
+強制スペルアウトモード（ConversionMode.SPELL_ALL）の変換結果は、英字1文字ごとの
+dictionaries.SPELL の読みだけで決まる。それでも変換器に渡すと、単語への分割や辞書の検索など、
+通常のモードと同じ処理を通ることになる。パスワードや製品コードを読むためにこのモードを使い続ける利用者には、
+この待ち時間がそのまま読み上げの遅れになる。
+
+ここでは SPELL から英字1文字→読みの変換表を作り、str.translate で文字列全体を一度に変換する。
+変換表は辞書の世代ごとに1回だけ作る。変換の前には、変換器を通す場合と同じく
+addressReader の前処理を行うので、結果は Converter.process と同じになる。
+identifierSplitter は使わない。_ などの記号もそのまま残して読む。
+
+ただし、英字の間の空白や記号、数字をどう扱うかは変換器の実装による。
+そこで変換表を作るたびに、_PROBES の文字列を convert と同じ振り分けで変換し、変換器の結果と比べて、
+1つでも異なれば変換表は使わない。
+
+次の場合は、変換表を使わずに変換器に任せる。
+
+* SPELL に A から Z までの読みがそろっていない
+* _PROBES の変換結果が、変換器と異なる
+* ASCII 以外の英字（全角のもの、アクセント記号などが付いたもの、合字など）や、結合文字を含む。
+  変換器はこれらを通常の英字に変換してから読むので、変換表では同じ結果にならない
+"""
+
+import re
+import string
+import unicodedata
+from functools import lru_cache
+
+from logHandler import log
+
+from . import addressReader
+from . import converter
+from . import dictionarySwitcher
+from ._englishToKanaConverter.englishToKanaConverter import ConversionMode, dictionaries
+
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+_ASCII_LETTER = re.compile(r"[A-Za-z]")
+
+# 変換表が変換器と同じ結果になることを確かめる文字列。
+# 続いた英字、空白、記号、数字、_、日本語との境目を含める。
+# アクセント記号などが付いた英字は変換器に任せるので、その振り分けも確かめる
+_PROBES = (
+	string.ascii_uppercase,
+	string.ascii_lowercase,
+	"A a  Ab\tCD\nef",
+	"camelCase PascalCase snake_case_name _a_ a__b",
+	"x64 mp3 utf8 1a2b3c 3.14 10km",
+	"a-b.c,d;e:f!g?h",
+	"(a) [b] {c} <d> 'e' \"f\" `g`",
+	"A&B #c $d %e +f =g ~h *i |j ^k",
+	"これはabcです。「ABC」、x（y）",
+	"café naïve résumé Ångström",
+	"Straße Øre æon łódź",
+	"ﬁle ＡＢＣ ｘｙｚ",
+	"cafe\u0301",
+)
+
+# (辞書の世代, 変換表)。変換表が作れなければ None
+_cache = (None, None)
+
+
+def _buildTable():
+	spell = dictionaries.SPELL
+	if not all(letter in spell for letter in string.ascii_uppercase):
+		return None
+	table = {}
+	for letter in string.ascii_uppercase:
+		table[ord(letter)] = spell[letter]
+		table[ord(letter.lower())] = spell[letter]
+	process = converter.get().process
+	for probe in _PROBES:
+		if _convert(probe, table) != process(probe, mode=ConversionMode.SPELL_ALL):
+			log.debugWarning("ERE: the spell-out table does not match the converter for %r" % probe)
+			return None
+	return table
+
+
+@lru_cache(maxsize=4096)
+def _isForeignLetter(ch):
+	"""ASCII 以外の ch を、変換器が英字に変換するかもしれないか。"""
+	return (
+		"LATIN" in unicodedata.name(ch, "")
+		or unicodedata.category(ch).startswith("M")
+		or _ASCII_LETTER.search(unicodedata.normalize("NFKD", ch)) is not None
+	)
+
+
+def _needsConverter(text):
+	if text.isascii():
+		return False
+	return any(_isForeignLetter(ch) for ch in _NON_ASCII.findall(text))
+
+
+def _convert(text, table):
+	if _needsConverter(text):
+		return converter.get().process(text, mode=ConversionMode.SPELL_ALL)
+	return addressReader.replace(text, ConversionMode.SPELL_ALL).translate(table)
+
+
+def getTable():
+	"""現在の辞書の変換表。作れなければ None。"""
+	global _cache
+	generation = dictionarySwitcher.getGeneration()
+	cachedGeneration, table = _cache
+	if cachedGeneration != generation:
+		table = _buildTable()
+		# 世代と変換表を1つのタプルで差し替えるので、別のスレッドから食い違った組は見えない
+		_cache = (generation, table)
+	return table
+
+
+def convert(text):
+	"""text を強制スペルアウトモードで変換する。"""
+	table = getTable()
+	if table is None:
+		return converter.get().process(text, mode=ConversionMode.SPELL_ALL)
+	return _convert(text, table)
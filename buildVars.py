@@ -1,5 +1,6 @@
 # -*- coding: UTF-8 -*-
 
+import json
 import os
 
 ADDON_VERSION = "1.1.3"
@@ -84,6 +85,20 @@ if os.environ.get("TAG_NAME") and os.path.isdir(_DEV_DICTIONARIES):
 		% (len(_devDictionaryFiles), ", ".join(_devDictionaryFiles))
 	)
 
+# tools/build_compressed_dictionaries.py で辞書を圧縮してある場合は、元の JSON をパッケージに含めない。
+# 実行時には、globalPlugins/ERE/compressedDictionaries.py が初回の起動時に展開する
+_COMPRESSED_DICTIONARIES = os.path.join("addon", "globalPlugins", "ERE", "_compressedDictionaries", "manifest.json")
+if os.path.isfile(_COMPRESSED_DICTIONARIES):
+	with open(_COMPRESSED_DICTIONARIES, encoding="utf-8") as _f:
+		_compressedNames = sorted(json.load(_f)["files"])
+	for _name in _compressedNames:
+		excludedFiles.append(os.path.join("globalPlugins", "ERE", "_englishToKanaConverter", "englishToKanaConverter", "dictionaries", "%s.json" % _name))
+	# 省メモリモードの分割した辞書も、実行時に globalPlugins/ERE/dictionaryShards.py が展開した辞書から作る
+	_DICTIONARY_SHARDS = os.path.join("addon", "globalPlugins", "ERE", "_dictionaryShards")
+	for _dir, _dirs, _files in os.walk(_DICTIONARY_SHARDS):
+		for _name in _files:
+			excludedFiles.append(os.path.relpath(os.path.join(_dir, _name), "addon"))
+
 # Base language for the NVDA add-on
 # If your add-on is written in a language other than english, modify this variable.
 # For example, set baseLanguage to "es" if your add-on is primarily written in spanish.
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+# 接頭辞・接尾辞の規則で読みを導ける辞書の項目を見つけ、取り除いた辞書を作る
+
+"""phrases.json などの項目のうち、取り除いても変換器が同じ読みを返すものを見つける。
+ABANDON があれば、ABANDONED や ABANDONING は SUFFIX の規則で同じ読みになることが多い。
+そうした項目を取り除いた辞書と、大きさ・読み込み時間・メモリの差を書き出す。
+
+    python tools/analyze_derivable_entries.py [--tables phrases,words] [--dictionaries DIR]
+        [--output DIR] [--workers N] [--all]
+
+調べ方は次の通り。
+
+1. 候補を選ぶ。PREFIX と SUFFIX のトライ木で、接頭辞・接尾辞を除くと
+   ほかの見出し語になる項目だけを候補とする。語幹が見出し語かどうかは語幹ごとに控えるので、
+   同じ語幹の項目が多くても1回しか調べない。--all では、すべての項目を候補とする
+2. 候補を、いくつかのプロセスで手分けして調べる。項目を1つ取り除いて、小文字のものと先頭だけ大文字のもの
+   （tools/build_materialized_readings.py と同じ形）を変換し、取り除く前と同じ読みになるかを確かめ、元に戻す
+3. 同じ読みになった項目をすべて取り除いた辞書で、もう一度すべてを変換して確かめる。
+   ほかの項目と一緒に取り除くと読みが変わるもの（語幹も取り除かれたものなど）は辞書に戻し、
+   変わらなくなるまで繰り返す
+
+出力先には、取り除いた後の辞書の JSON と、取り除いた見出し語を含む report.json を書き出す。
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from functools import lru_cache
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+from tools.build_materialized_readings import forms
+
+SOURCE_DIR = os.path.join(nvda_stubs.ADDON_DIR, "_englishToKanaConverter", "englishToKanaConverter", "dictionaries")
+DEFAULT_TABLES = "phrases,words"
+DEFAULT_OUTPUT = "pruned_dictionaries"
+
+# 1回に1つのプロセスへ渡す項目の数
+BATCH_SIZE = 500
+
+# 最後の確かめで、読みの変わった項目を戻すのを繰り返す回数の上限
+MAX_ROUNDS = 5
+
+# 読み込み時間を計る回数
+LOAD_REPEAT = 5
+
+# トライ木で、そこまでで1つの接頭辞・接尾辞になることを表すキー。文字と重ならないよう空文字列を使う
+_END = ""
+
+# 手分けするプロセスの中の変換器と辞書
+_engine = None
+_dictionaries = None
+
+
+def _initWorker(directory, removed):
+	"""手分けするプロセスで、変換器を用意し、removed（属性名→見出し語の一覧）を辞書から取り除く。"""
+	global _engine, _dictionaries
+	if directory:
+		nvda_stubs.loadDictionaries(directory)
+	module = nvda_stubs.importAddonModule("_englishToKanaConverter.englishToKanaConverter")
+	_engine = module.EnglishToKanaConverter()
+	_dictionaries = module.dictionaries
+	for attribute, keys in removed.items():
+		table = getattr(_dictionaries, attribute)
+		for key in keys:
+			table.pop(key, None)
+
+
+def _readings(key):
+	return [_engine.process(form) for form in forms(key.lower())]
+
+
+def _check(task):
+	"""項目を1つずつ取り除いて変換し、(見出し語, 取り除く前の読み) のうち、読みが変わらなかったものを返す。"""
+	attribute, keys = task
+	table = getattr(_dictionaries, attribute)
+	derivable = []
+	for key in keys:
+		expected = _readings(key)
+		value = table.pop(key)
+		try:
+			if _readings(key) == expected:
+				derivable.append((key, expected))
+		finally:
+			table[key] = value
+	return attribute, derivable
+
+
+def _verify(task):
+	"""取り除いた辞書のまま変換し、読みが変わった見出し語を返す。"""
+	attribute, items = task
+	return attribute, [key for key, expected in items if _readings(key) != expected]
+
+
+def _buildTrie(keys):
+	root = {}
+	for key in keys:
+		node = root
+		for ch in key:
+			node = node.setdefault(ch, {})
+		node[_END] = True
+	return root
+
+
+def _matchLengths(trie, chars):
+	"""chars の先頭から trie をたどり、当てはまる長さをすべて返す。"""
+	lengths = []
+	node = trie
+	for i, ch in enumerate(chars):
+		node = node.get(ch)
+		if node is None:
+			break
+		if _END in node:
+			lengths.append(i + 1)
+	return lengths
+
+
+class Candidates:
+	"""接頭辞・接尾辞を除くとほかの見出し語になる項目を選ぶ。"""
+
+	def __init__(self, dictionaries):
+		self._prefixes = _buildTrie(dictionaries.PREFIX)
+		self._suffixes = _buildTrie(key[::-1] for key in dictionaries.SUFFIX)
+		self._headwords = set(dictionaries.WORDS) | set(dictionaries.PHRASES)
+		self.isStem = lru_cache(maxsize=None)(self._isStem)
+
+	def _isStem(self, stem):
+		return stem in self._headwords
+
+	def isCandidate(self, key):
+		length = len(key)
+		prefixLengths = [0] + _matchLengths(self._prefixes, key)
+		suffixLengths = [0] + _matchLengths(self._suffixes, reversed(key))
+		return any(
+			self.isStem(key[p:length - s])
+			for p in prefixLengths
+			for s in suffixLengths
+			if 0 < p + s < length
+		)
+
+
+def _batches(attribute, items):
+	for start in range(0, len(items), BATCH_SIZE):
+		yield attribute, items[start:start + BATCH_SIZE]
+
+
+def analyze(tableNames, directory, workers, checkAll, quiet=False):
+	"""取り除ける項目を調べ、属性名→{見出し語: 取り除く前の読み} を返す。"""
+	switcher = nvda_stubs.importAddonModule("dictionarySwitcher")
+	if directory:
+		nvda_stubs.loadDictionaries(directory)
+	dictionaries = switcher.dictionaries
+	attributes = [switcher._TARGETS[name] for name in tableNames]
+	candidates = Candidates(dictionaries)
+	tasks = []
+	for attribute in attributes:
+		keys = [key for key in getattr(dictionaries, attribute) if checkAll or candidates.isCandidate(key)]
+		if not quiet:
+			print("  %-8s %d 件のうち、候補は %d 件 (語幹の控え: %d 件)" % (
+				attribute, len(getattr(dictionaries, attribute)), len(keys), candidates.isStem.cache_info().currsize,
+			))
+		tasks.extend(_batches(attribute, keys))
+
+	derivable = {attribute: {} for attribute in attributes}
+	start = time.perf_counter()
+	with multiprocessing.Pool(workers, initializer=_initWorker, initargs=(directory, {})) as pool:
+		for attribute, items in pool.imap_unordered(_check, tasks):
+			derivable[attribute].update(items)
+	if not quiet:
+		print("  1つずつ取り除いて確かめました (%.1f 秒)" % (time.perf_counter() - start))
+
+	for attempt in range(MAX_ROUNDS):
+		removed = {attribute: sorted(items) for attribute, items in derivable.items()}
+		tasks = []
+		for attribute, items in derivable.items():
+			tasks.extend(_batches(attribute, sorted(items.items())))
+		changed = 0
+		with multiprocessing.Pool(workers, initializer=_initWorker, initargs=(directory, removed)) as pool:
+			for attribute, keys in pool.imap_unordered(_verify, tasks):
+				for key in keys:
+					del derivable[attribute][key]
+				changed += len(keys)
+		if not quiet:
+			print("  まとめて取り除いて確かめました: %d 件を戻しました" % changed)
+		if not changed:
+			break
+	else:
+		raise RuntimeError("%d 回繰り返しても、読みの変わる項目が無くなりませんでした。" % MAX_ROUNDS)
+	return derivable
+
+
+def measureLoad(path):
+	"""path を json.load する時間の中央値と、読み込んだ後に残るメモリ。"""
+	times = []
+	# 1回目はファイルの読み込みなどが含まれるので計らない
+	for i in range(LOAD_REPEAT + 1):
+		start = time.perf_counter()
+		with open(path, encoding="utf-8") as f:
+			json.load(f)
+		if i:
+			times.append(time.perf_counter() - start)
+	gc.collect()
+	tracemalloc.start()
+	try:
+		with open(path, encoding="utf-8") as f:
+			loaded = json.load(f)
+		retained = tracemalloc.get_traced_memory()[0]
+	finally:
+		tracemalloc.stop()
+	del loaded
+	return {"bytes": os.path.getsize(path), "loadTime": statistics.median(times), "retained": retained}
+
+
+def writePruned(tableNames, directory, derivable, output):
+	"""取り除いた後の辞書を書き出し、表ごとの前後の大きさなどを返す。"""
+	switcher = nvda_stubs.importAddonModule("dictionarySwitcher")
+	source = directory or SOURCE_DIR
+	os.makedirs(output, exist_ok=True)
+	report = {}
+	for name in tableNames:
+		attribute = switcher._TARGETS[name]
+		sourcePath = os.path.join(source, "%s.json" % name)
+		with open(sourcePath, encoding="utf-8") as f:
+			table = json.load(f)
+		removed = derivable[attribute]
+		pruned = {key: value for key, value in table.items() if key not in removed}
+		prunedPath = os.path.join(output, "%s.json" % name)
+		with open(prunedPath, "w", encoding="utf-8") as f:
+			json.dump(pruned, f, ensure_ascii=False, indent="\t")
+		# 元のファイルと書き方をそろえて比べるため、元の辞書も同じ書き方で書き出し直して計る
+		originalPath = prunedPath + ".original"
+		with open(originalPath, "w", encoding="utf-8") as f:
+			json.dump(table, f, ensure_ascii=False, indent="\t")
+		try:
+			before = measureLoad(originalPath)
+		finally:
+			os.remove(originalPath)
+		report[name] = {
+			"entries": len(table),
+			"removed": len(table) - len(pruned),
+			"before": before,
+			"after": measureLoad(prunedPath),
+			"removedKeys": sorted(removed),
+		}
+	with open(os.path.join(output, "report.json"), "w", encoding="utf-8") as f:
+		json.dump(report, f, ensure_ascii=False, indent=1)
+	return report
+
+
+def printReport(report):
+	kb = lambda size: "%.1f KB" % (size / 1024)
+	for name, result in report.items():
+		before, after = result["before"], result["after"]
+		print("■ %s.json: %d 件のうち %d 件を取り除けます" % (name, result["entries"], result["removed"]))
+		print("  %-14s %12s -> %12s" % ("大きさ", kb(before["bytes"]), kb(after["bytes"])))
+		print("  %-14s %9.1f ms -> %9.1f ms" % ("読み込み時間", before["loadTime"] * 1000, after["loadTime"] * 1000))
+		print("  %-14s %12s -> %12s" % ("メモリ", kb(before["retained"]), kb(after["retained"])))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="接頭辞・接尾辞の規則で読みを導ける辞書の項目を見つけ、取り除いた辞書を作る。")
+	parser.add_argument("--tables", default=DEFAULT_TABLES, help="調べる辞書。カンマで区切る")
+	parser.add_argument("--dictionaries", help="辞書の JSON を置いたディレクトリ。省略時は同梱の辞書を使う")
+	parser.add_argument("--output", default=DEFAULT_OUTPUT, help="取り除いた後の辞書と report.json を書き出すディレクトリ")
+	parser.add_argument("--workers", type=int, default=os.cpu_count(), help="手分けするプロセスの数")
+	parser.add_argument("--all", action="store_true", help="接頭辞・接尾辞で分けられない項目も調べる")
+	args = parser.parse_args()
+	tableNames = [name.strip() for name in args.tables.split(",") if name.strip()]
+	derivable = analyze(tableNames, args.dictionaries, args.workers, args.all)
+	printReport(writePruned(tableNames, args.dictionaries, derivable, args.output))
+	return 0
+
+
+if __name__ == "__main__":
+	try:
+		sys.exit(main())
+	except RuntimeError as e:
+		print(e, file=sys.stderr)
+		sys.exit(1)
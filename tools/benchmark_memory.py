@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# アドオンが保持しているメモリを、辞書や控えごとに計る
+
+"""NVDA の代用品（tools/nvda_stubs.py）の上で GlobalPlugin を作り、保持しているメモリを内訳ごとに計る。
+辞書の持ち方を変える前後で比べるためのもの。
+
+    python tools/benchmark_memory.py [--builtin builtin.dic] [--fill 100,1000,5000] [--json]
+
+計るものは次の通り。
+
+* tables: dictionaries の PHRASES、WORDS、PREFIX、SUFFIX、ROMAN、SPELL。
+  含まれるオブジェクトを sys.getsizeof でたどって合計する
+* switcher: dictionarySwitcher._defaults と _devCache（開発中の辞書があれば、一度切り替えてから戻す）。
+  既定の辞書を控えた _defaults は dictionaries の表と同じオブジェクトなので、tables と重複して数える
+* builtinDict: GlobalPlugin が控える組み込みの読み上げ辞書（builtinDict_original）と、
+  不要な項目を除いた builtinDict_filtered。--builtin で NVDA の builtin.dic を指定した場合だけ計る
+* caches: 変換結果などの控えを、--fill の件数まで埋めたときに増えたメモリ（tracemalloc による）
+* jsonLoad: phrases.json を json.load したときの、最大のメモリ使用量と、読み込んだ後に残る量
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from array import array
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+
+TABLES = ("PHRASES", "WORDS", "PREFIX", "SUFFIX", "ROMAN", "SPELL")
+DEFAULT_FILLS = "100,1000,5000"
+
+
+def deepSize(obj, seen=None):
+	"""obj から参照をたどれるオブジェクトの sys.getsizeof の合計。同じオブジェクトは1回だけ数える。"""
+	if seen is None:
+		seen = set()
+	total = 0
+	stack = [obj]
+	while stack:
+		current = stack.pop()
+		if id(current) in seen:
+			continue
+		seen.add(id(current))
+		total += sys.getsizeof(current)
+		if isinstance(current, (str, bytes, bytearray, array, int, float, bool)) or current is None:
+			continue
+		if isinstance(current, dict):
+			stack.extend(current.keys())
+			stack.extend(current.values())
+		elif isinstance(current, (list, tuple, set, frozenset)):
+			stack.extend(current)
+		elif hasattr(current, "__dict__") and not isinstance(current, type):
+			stack.append(vars(current))
+	return total
+
+
+def retainedBy(fill):
+	"""fill() を呼ぶ前後で、tracemalloc で見たメモリの増分。"""
+	gc.collect()
+	tracemalloc.start()
+	try:
+		keep = fill()
+		gc.collect()
+		size = tracemalloc.get_traced_memory()[0]
+	finally:
+		tracemalloc.stop()
+	del keep
+	return size
+
+
+def sampleTexts(dictionaries, count, seed=0):
+	"""辞書の見出し語を組み合わせた、重複の無い文字列を count 件作る。"""
+	rng = random.Random(seed)
+	words = [key.lower() for key in dictionaries.WORDS] + [key.lower() for key in dictionaries.PHRASES]
+	texts = set()
+	while len(texts) < count:
+		texts.add(" ".join(rng.choice(words) for i in range(rng.randint(1, 8))))
+	return sorted(texts)
+
+
+def measureCaches(ERE, fills):
+	converter = ERE.converter.get()
+	mode = ERE.ConversionMode.STANDARD
+	texts = sampleTexts(ERE.dictionarySwitcher.dictionaries, max(fills))
+	converted = {text: converter.process(text, mode=mode) for text in texts}
+	results = {}
+	for fill in fills:
+		subset = texts[:fill]
+
+		def prefetch():
+			cache = ERE.prefetcher.ConversionCache(size=fill)
+			for text in subset:
+				cache.put(cache.makeKey(text, mode), converted[text])
+			return cache
+
+		def persistent():
+			cache = ERE.persistentCache.PersistentCache(os.path.join(tempfile.gettempdir(), "ERE_unused.jsonl"), maxEntries=fill)
+			# ファイルは読み書きせず、メモリ上の控えだけを計る
+			cache._ready = True
+			for text in subset:
+				cache.put(text, mode, converted[text])
+			# 書き込みを待つ分は、書き込む側のスレッドがすぐに捨てるので数えない
+			return cache._entries
+
+		def missTracker():
+			tracker = ERE.missTracker.MissTracker(capacity=fill)
+			for text in subset:
+				for word in text.split():
+					tracker.add(word)
+			return tracker
+
+		results[fill] = {
+			"prefetcher": retainedBy(prefetch),
+			"persistentCache": retainedBy(persistent),
+			"missTracker": retainedBy(missTracker),
+		}
+	return results
+
+
+def measureJsonLoad(path):
+	with open(path, encoding="utf-8") as f:
+		text = f.read()
+	gc.collect()
+	tracemalloc.start()
+	try:
+		with open(path, encoding="utf-8") as f:
+			loaded = json.load(f)
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return {"path": path, "fileBytes": len(text.encode("utf-8")), "entries": len(loaded), "peak": peak, "retained": current}
+
+
+def measure(args):
+	fills = sorted({int(value) for value in args.fill.split(",") if value.strip()})
+	result = {}
+	with tempfile.TemporaryDirectory(prefix="ERE_config_") as configPath:
+		nvda_stubs.installPluginEnvironment(configPath)
+		if args.builtin:
+			import speechDictHandler
+			speechDictHandler.dictionaries["builtin"].load(args.builtin)
+		ERE = nvda_stubs.importAddonPackage()
+		dictionaries = ERE.dictionarySwitcher.dictionaries
+		result["tables"] = {name: deepSize(getattr(dictionaries, name)) for name in TABLES}
+
+		switcher = ERE.dictionarySwitcher
+		if switcher.isAvailable():
+			switcher.useDev()
+			switcher.useDefault()
+		result["switcher"] = {
+			"_defaults": deepSize(switcher._defaults),
+			"_devCache": deepSize(switcher._devCache),
+		}
+
+		plugin = ERE.GlobalPlugin()
+		if args.builtin:
+			result["builtinDict"] = {
+				"builtinDict_original": deepSize(plugin.builtinDict_original),
+				"builtinDict_filtered": deepSize(plugin.builtinDict_filtered),
+			}
+		plugin.terminate()
+
+		result["caches"] = measureCaches(ERE, fills)
+		phrases = os.path.join(os.path.dirname(dictionaries.__file__), "phrases.json")
+		if os.path.isfile(phrases):
+			result["jsonLoad"] = measureJsonLoad(phrases)
+	return result
+
+
+def printReport(result):
+	kb = lambda size: "%10.1f KB" % (size / 1024)
+	print("■ dictionaries の表")
+	for name, size in result["tables"].items():
+		print("  %-22s %s" % (name, kb(size)))
+	print("■ dictionarySwitcher")
+	for name, size in result["switcher"].items():
+		print("  %-22s %s" % (name, kb(size)))
+	if "builtinDict" in result:
+		print("■ 組み込みの読み上げ辞書")
+		for name, size in result["builtinDict"].items():
+			print("  %-22s %s" % (name, kb(size)))
+	print("■ 控え（件数ごと）")
+	for fill, sizes in result["caches"].items():
+		print("  %d 件" % fill)
+		for name, size in sizes.items():
+			print("    %-20s %s" % (name, kb(size)))
+	if "jsonLoad" in result:
+		load = result["jsonLoad"]
+		print("■ phrases.json の json.load (%d 件, ファイル %s)" % (load["entries"], kb(load["fileBytes"]).strip()))
+		print("  %-22s %s" % ("最大", kb(load["peak"])))
+		print("  %-22s %s" % ("読み込み後", kb(load["retained"])))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="アドオンが保持しているメモリを、辞書や控えごとに計る。")
+	parser.add_argument("--builtin", help="NVDA の speechDicts/builtin.dic のパス")
+	parser.add_argument("--fill", default=DEFAULT_FILLS, help="控えを埋める件数。カンマで区切って複数指定できる")
+	parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+	args = parser.parse_args()
+	result = measure(args)
+	if args.json:
+		print(json.dumps(result, ensure_ascii=False, indent=1))
+	else:
+		printReport(result)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
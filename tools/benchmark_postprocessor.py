@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# 組み込みの読み上げ辞書の適用を、元の処理と postProcessor とで比べる
+
+"""NVDA の組み込みの読み上げ辞書を、項目を1つずつ適用する元の処理と、
+postProcessor.FusedSpeechDict のまとめた走査とで適用し、結果が一致することと、
+処理時間とを確かめる。
+
+    python tools/benchmark_postprocessor.py "C:\\Program Files (x86)\\NVDA\\speechDicts\\builtin.dic" corpus.txt
+
+コーパスには、本アドオンが変換した後の文字列（カタカナを多く含むもの）を1行ずつ書いておく。
+--convert を付けると、englishToKanaConverter で変換してから比べる。
+コーパスを省略した場合は、組み込みの例文を使う。
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+
+SAMPLES = [
+	"ファイル を ひらけませんでした。 エラー コード 404",
+	"セッティング を ほぞん しますか？ はい いいえ",
+	"ダウンロード 57% かんりょう、 のこり 3ふん",
+	"ザ クイック ブラウン フォックス ジャンプス オーバー ザ レイジー ドッグ.",
+	"きょうは 2026年10月19日 です。",
+	"リンク ホーム ページ、 ボタン サーチ",
+	"ver 1.1.3 を インストール しました",
+	"メール: support@actlab.org",
+]
+
+
+def loadCorpus(paths, convert):
+	lines = []
+	for path in paths:
+		with open(path, encoding="utf-8") as f:
+			lines.extend(line.rstrip("\n") for line in f if line.strip())
+	if not lines:
+		lines = list(SAMPLES)
+	if convert:
+		converter = nvda_stubs.importAddonModule("converter")
+		c = converter.get()
+		lines = [c.process(line) for line in lines]
+	return lines
+
+
+def main():
+	parser = argparse.ArgumentParser(description="組み込みの読み上げ辞書を、まとめた走査で適用した場合と比べる。")
+	parser.add_argument("dictionary", help="NVDA の speechDicts/builtin.dic")
+	parser.add_argument("corpus", nargs="*", help="比べる文字列を1行ずつ書いたファイル")
+	parser.add_argument("--convert", action="store_true", help="englishToKanaConverter で変換してから比べる")
+	parser.add_argument("--number", type=int, default=20, help="計測の繰り返し回数")
+	args = parser.parse_args()
+
+	nvda_stubs.install()
+	import speechDictHandler
+	postProcessor = nvda_stubs.importAddonModule("postProcessor")
+
+	builtin = speechDictHandler.SpeechDict()
+	builtin.load(args.dictionary)
+	# 本アドオンを有効にしたときと同じ項目で比べる
+	reference = speechDictHandler.SpeechDict(entry for entry in builtin if entry.pattern not in postProcessor.UNUSED_BUILTIN_PATTERNS)
+	fused = postProcessor.FusedSpeechDict(reference)
+	runs = postProcessor.compileRuns(reference)
+	corpus = loadCorpus(args.corpus, args.convert)
+
+	print("項目数: %d (取り除いた項目: %d)" % (len(reference), len(builtin) - len(reference)))
+	print("まとめた走査の数: %d (単独で適用する項目: %d)" % (
+		sum(1 for gate, members in runs if gate is not None),
+		sum(1 for gate, members in runs if gate is None),
+	))
+	print("文字列の数: %d" % len(corpus))
+
+	def applyReference():
+		return [reference.sub(text) for text in corpus]
+
+	def applyFused():
+		with postProcessor.japanese():
+			return [fused.sub(text) for text in corpus]
+
+	expected = applyReference()
+	actual = applyFused()
+	mismatches = [(text, a, b) for text, a, b in zip(corpus, expected, actual) if a != b]
+	for text, a, b in mismatches[:10]:
+		print("不一致: %r\n  元の処理: %r\n  まとめた走査: %r" % (text, a, b))
+
+	referenceTime = min(timeit.repeat(applyReference, number=args.number, repeat=5)) / args.number
+	fusedTime = min(timeit.repeat(applyFused, number=args.number, repeat=5)) / args.number
+	print("元の処理:       %.3f ms" % (referenceTime * 1000))
+	print("まとめた走査:   %.3f ms (%.1f 倍)" % (fusedTime * 1000, referenceTime / fusedTime if fusedTime else 0))
+	if mismatches:
+		print("%d 件の結果が一致しませんでした。" % len(mismatches))
+		return 1
+	print("すべての結果が一致しました。")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# NVDA の起動時にアドオンが使う時間を、新しいインタープリターで繰り返し計る
+
+"""NVDA の代用品（tools/nvda_stubs.py）の上で、アドオンの起動にかかる時間を段階ごとに計る。
+毎回新しいインタープリターを起動するので、2回目以降もキャッシュの無い状態で計れる。
+
+    python tools/benchmark_startup.py [--runs N] [--top N] [--json]
+
+計る段階は次の通り。中央値を報告する。
+
+* import: globalPlugins.ERE の読み込み。辞書モジュールの読み込みを含む
+* dictionaries: そのうち、englishToKanaConverter の辞書モジュールの読み込み（-X importtime による）
+* useDev: dictionarySwitcher.useDev()（開発中の辞書が無ければ計らない）
+* init: GlobalPlugin.__init__
+* firstUtterance: 組み込んだ processText を通した最初の読み上げの変換
+
+また、-X importtime の結果から、アドオンのモジュールごとの読み込み時間を、長い順に報告する。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+
+FIRST_UTTERANCE = "Open the settings dialog, then press the OK button to save your changes."
+PHASES = ("import", "dictionaries", "useDev", "init", "firstUtterance")
+
+
+def child():
+	"""計測する側のインタープリターで行う処理。結果を JSON で標準出力に書く。"""
+	result = {}
+	with tempfile.TemporaryDirectory(prefix="ERE_config_") as configPath:
+		nvda_stubs.installPluginEnvironment(configPath)
+		start = time.perf_counter()
+		ERE = nvda_stubs.importAddonPackage()
+		result["import"] = time.perf_counter() - start
+		dictionarySwitcher = ERE.dictionarySwitcher
+		if dictionarySwitcher.isAvailable():
+			start = time.perf_counter()
+			dictionarySwitcher.useDev()
+			result["useDev"] = time.perf_counter() - start
+			dictionarySwitcher.useDefault()
+		start = time.perf_counter()
+		plugin = ERE.GlobalPlugin()
+		result["init"] = time.perf_counter() - start
+		import speech
+		start = time.perf_counter()
+		speech.speech.processText("ja_JP", FIRST_UTTERANCE, 0)
+		result["firstUtterance"] = time.perf_counter() - start
+		plugin.terminate()
+	print(json.dumps(result))
+
+
+def parseImportTime(stderr):
+	"""-X importtime の出力から、アドオンのモジュールごとの (自身の時間, 累計の時間) を秒で返す。"""
+	times = {}
+	for line in stderr.splitlines():
+		if not line.startswith("import time:") or "|" not in line:
+			continue
+		fields = [field.strip() for field in line[len("import time:"):].split("|")]
+		name = fields[2]
+		if not name.startswith(nvda_stubs.ADDON_PACKAGE):
+			continue
+		try:
+			times[name] = (int(fields[0]) / 1e6, int(fields[1]) / 1e6)
+		except ValueError:
+			# 見出しの行
+			continue
+	return times
+
+
+def runOnce():
+	proc = subprocess.run(
+		[sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child"],
+		stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding="utf-8", errors="replace",
+	)
+	if proc.returncode != 0:
+		raise RuntimeError("計測に失敗しました:\n%s" % proc.stderr[-2000:])
+	result = json.loads(proc.stdout.strip().splitlines()[-1])
+	modules = parseImportTime(proc.stderr)
+	result["dictionaries"] = sum(
+		cumulative for name, (own, cumulative) in modules.items()
+		if name.endswith(".dictionaries")
+	)
+	return result, modules
+
+
+def main():
+	parser = argparse.ArgumentParser(description="NVDA の起動時にアドオンが使う時間を計る。")
+	parser.add_argument("--runs", type=int, default=7, help="計測の回数")
+	parser.add_argument("--top", type=int, default=15, help="報告するモジュールの数")
+	parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+	parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		child()
+		return 0
+
+	phases = {phase: [] for phase in PHASES}
+	modules = {}
+	for i in range(args.runs):
+		result, times = runOnce()
+		for phase in PHASES:
+			if phase in result:
+				phases[phase].append(result[phase])
+		for name, value in times.items():
+			modules.setdefault(name, []).append(value)
+	summary = {
+		"runs": args.runs,
+		"phases": {phase: statistics.median(values) for phase, values in phases.items() if values},
+		"modules": {
+			name: {
+				"self": statistics.median(own for own, cumulative in values),
+				"cumulative": statistics.median(cumulative for own, cumulative in values),
+			}
+			for name, values in modules.items()
+		},
+	}
+	if args.json:
+		print(json.dumps(summary, ensure_ascii=False, indent=1))
+		return 0
+
+	print("%d 回の中央値" % args.runs)
+	for phase in PHASES:
+		if phase in summary["phases"]:
+			print("  %-16s %8.1f ms" % (phase, summary["phases"][phase] * 1000))
+		else:
+			print("  %-16s %8s" % (phase, "-"))
+	print()
+	print("モジュールごとの読み込み時間（自身の時間の長い順）")
+	print("  %10s %10s  %s" % ("自身", "累計", "モジュール"))
+	ranked = sorted(summary["modules"].items(), key=lambda item: item[1]["self"], reverse=True)
+	for name, value in ranked[:args.top]:
+		print("  %8.1fms %8.1fms  %s" % (value["self"] * 1000, value["cumulative"] * 1000, name[len(nvda_stubs.ADDON_PACKAGE) + 1:] or name))
+	return 0
+
+
+if __name__ == "__main__":
+	try:
+		sys.exit(main())
+	except RuntimeError as e:
+		print(e, file=sys.stderr)
+		sys.exit(1)
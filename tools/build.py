@@ -6,23 +6,71 @@
 #Copyright (C) 2021 Hiroki Fujii <hfujii@hisystron.com>
 
 #constantsのimport前に必要
-from audioop import add
 import os
 import sys
 sys.path.append(os.getcwd())
 
+import concurrent.futures
 import datetime
 import glob
-import hashlib
 import json
 import math
 import shutil
 import subprocess
 import urllib.request
+import zipfile
 
 import buildVars
+from tools import build_cache
+from tools import build_dictionary_shards
+from tools import build_compressed_dictionaries
+from tools import build_materialized_readings
 from tools import bumpup
 
+ADDON_DIR = os.path.join("addon", "globalPlugins", "ERE")
+CONVERTER_DIR = os.path.join(ADDON_DIR, "_englishToKanaConverter")
+DICTIONARY_DIR = os.path.join(CONVERTER_DIR, "englishToKanaConverter", "dictionaries")
+
+# 辞書から作るファイルの手順。(名前, 関数, 入力, 出力)。互いに依存しないので、並行して実行する
+DICTIONARY_STEPS = (
+	(
+		"dictionaryShards", build_dictionary_shards.build,
+		[DICTIONARY_DIR, os.path.join("tools", "build_dictionary_shards.py"), os.path.join(ADDON_DIR, "dictionaryShards.py")],
+		[os.path.join(ADDON_DIR, "_dictionaryShards", "index.json")],
+	),
+	(
+		"materializedReadings", build_materialized_readings.build,
+		[CONVERTER_DIR, os.path.join("tools", "build_materialized_readings.py"), os.path.join("tools", "frequent_words.txt")] + glob.glob(os.path.join(ADDON_DIR, "*.py")),
+		[os.path.join(ADDON_DIR, "_materializedReadings.json")],
+	),
+	(
+		"compressedDictionaries", build_compressed_dictionaries.build,
+		[DICTIONARY_DIR, os.path.join("tools", "build_compressed_dictionaries.py"), os.path.join(ADDON_DIR, "compressedDictionaries.py"), "buildVars.py"],
+		[os.path.join(ADDON_DIR, "_compressedDictionaries", "manifest.json")],
+	),
+)
+
+# 作れなくてもビルドを続ける手順。compressedDictionaries が無ければ、元の辞書の JSON をそのままパッケージに含める
+OPTIONAL_STEPS = ("compressedDictionaries",)
+
+# パッケージの大きさの内訳として報告する、辞書と辞書から作ったファイル。(名前, パッケージの中のパスに含まれる文字列)
+PACKAGE_PARTS = (
+	("compressed dictionaries", "/ERE/_compressedDictionaries/"),
+	("converter dictionaries", "/englishToKanaConverter/dictionaries/"),
+	("dictionary shards", "/ERE/_dictionaryShards/"),
+	("materialized readings", "/ERE/_materializedReadings.json"),
+)
+
+# scons の入力と、そのうち scons 自身が作るので入力に含めないファイル
+SCONS_INPUTS = ["addon", "buildVars.py", "sconstruct", "site_scons", "manifest.ini.tpl", "manifest-translated.ini.tpl", "style.css"]
+SCONS_OUTPUTS = (
+	"addon/manifest.ini",
+	"addon/locale/*/manifest.ini",
+	"addon/locale/*/LC_MESSAGES/*.mo",
+	"addon/doc/*/*.html",
+	"addon/doc/style.css",
+)
+
 class build:
 	def __init__(self):
 		# Github actionsなどの自動実行かどうかを判別し、処理をスタート
@@ -30,7 +78,7 @@ class build:
 		print("Starting build for %s(automated mode=%s)" % (buildVars.ADDON_KEYWORD, automated,))
 
 		# パッケージのパスとファイル名を決定
-		package_path = "output\\"
+		package_path = "output" + os.sep
 		build_filename = os.environ.get('TAG_NAME', 'snapshot')
 		# snapshotではなかった場合は、タグ名とバージョンが違ったらエラー
 		if (build_filename != "snapshot") and (build_filename != buildVars.ADDON_VERSION):
@@ -43,8 +91,10 @@ class build:
 			print("Error: no addon folder found. Your working directory must be the root of the project. You shouldn't cd to tools and run this script.")
 			exit(-1)
 
-		# 前のビルドをクリーンアップ
-		self.clean(package_path)
+		# 前のビルドをクリーンアップ。--clean を指定しなければ、変わっていない手順は飛ばす
+		if "--clean" in sys.argv:
+			self.clean(package_path)
+		self.cache = build_cache.BuildCache()
 
 		# 自動実行でのスナップショットの場合はバージョン番号を一時的に書き換え
 		if build_filename == "snapshot" and automated:
@@ -55,11 +105,12 @@ class build:
 		archive_name = "%s-%s.zip" % (buildVars.ADDON_KEYWORD, build_filename,)
 		addon_filename = "%s-%s.nvda-addon" % (buildVars.ADDON_NAME, buildVars.ADDON_VERSION,)
 		shutil.copyfile(package_path + addon_filename, addon_filename)
+		self.reportPackageSize(addon_filename)
 		self.makePackageInfo(archive_name, addon_filename, build_filename)
 		print("Build finished!")
 
 	def runcmd(self,cmd):
-		proc=subprocess.Popen(cmd.split(), shell=True, stdout=1, stderr=2)
+		proc=subprocess.Popen(cmd.split(), shell=(os.name == "nt"), stdout=1, stderr=2)
 		proc.communicate()
 		return proc.poll()
 
@@ -69,7 +120,9 @@ class build:
 	def clean(self,package_path):
 		if os.path.isdir(package_path):
 			print("Clearling previous build...")
-			shutil.rmtree("output\\")
+			shutil.rmtree(package_path)
+		if os.path.isfile(build_cache.CACHE_FILE):
+			os.remove(build_cache.CACHE_FILE)
 
 	def makeSnapshotVersionNumber(self):
 		#日本標準時オブジェクト
@@ -85,33 +138,105 @@ class build:
 
 	def build(self, package_path, build_filename):
 		print("Building...")
-		shutil.copyfile("addon\\doc\\ja\\readme.md", "public\\readme.md")
-		# publicの中身をpackage_pathにコピー
+		self.buildDictionaries()
+		self.compressedDictionaries = None
+		manifest = os.path.join(ADDON_DIR, "_compressedDictionaries", "manifest.json")
+		if os.path.isfile(manifest):
+			with open(manifest, encoding="utf-8") as f:
+				self.compressedDictionaries = json.load(f)["files"]
+
+		addon_filename = "%s-%s.nvda-addon" % (buildVars.ADDON_NAME, buildVars.ADDON_VERSION,)
+		# 正式リリースかどうかで、buildVars.py がパッケージに含めるファイルが変わる
+		digest = self.cache.digest(SCONS_INPUTS, SCONS_OUTPUTS, extra=os.environ.get("TAG_NAME", ""))
+		if self.cache.isFresh("scons", digest, [package_path + addon_filename]):
+			print("Add-on package is up to date.")
+		else:
+			# 翻訳やドキュメントは、scons が並行して作る
+			ret = self.runcmd("scons -j%d" % (os.cpu_count() or 1))
+			print("build finished with status %d" % ret)
+			if ret != 0:
+				sys.exit(ret)
+			self.cache.record("scons", digest)
+
+		shutil.copyfile(os.path.join("addon", "doc", "ja", "readme.md"), os.path.join("public", "readme.md"))
+		archive_name = "%s-%s.zip" % (buildVars.ADDON_KEYWORD, build_filename,)
+		digest = self.cache.digest(["public", package_path + addon_filename])
+		if self.cache.isFresh("package", digest, [archive_name]):
+			print("Archive is up to date.")
+			return
+		# scons が作ったパッケージ以外を消してから、publicの中身をpackage_pathにコピー
 		# .gitkeepがコピーされないように、手動で処理
-		if not os.path.isdir(package_path):
-			os.makedirs(package_path)
-		for path in glob.glob("public\\*"):
+		for path in glob.glob(os.path.join(package_path, "*")):
+			if os.path.basename(path) == addon_filename:
+				continue
+			elif os.path.isdir(path):
+				shutil.rmtree(path)
+			else:
+				os.remove(path)
+		for path in glob.glob(os.path.join("public", "*")):
 			if os.path.basename(path).startswith("."):
 				continue
 			elif os.path.isdir(path):
 				shutil.copytree(path, package_path + os.path.basename(path))
 			else:
 				shutil.copyfile(path, package_path + os.path.basename(path))
-		ret = self.runcmd("scons")
-		print("build finished with status %d" % ret)
-		if ret != 0:
-			sys.exit(ret)
 		print("Compressing into package...")
 		shutil.make_archive("%s-%s" % (buildVars.ADDON_KEYWORD, build_filename,),'zip',package_path)
+		self.cache.record("package", digest)
+
+	def buildDictionaries(self):
+		"""辞書から作るファイルのうち、入力が変わったものだけを、別々のプロセスで並行して作る。"""
+		stale = []
+		for name, function, inputs, outputs in DICTIONARY_STEPS:
+			digest = self.cache.digest(inputs)
+			if self.cache.isFresh(name, digest, outputs):
+				print("%s is up to date." % name)
+			else:
+				stale.append((name, function, digest))
+		if not stale:
+			return
+		with concurrent.futures.ProcessPoolExecutor(len(stale)) as executor:
+			futures = [(name, digest, executor.submit(function, quiet=True)) for name, function, digest in stale]
+			for name, digest, future in futures:
+				try:
+					future.result()
+				except RuntimeError as e:
+					if name not in OPTIONAL_STEPS:
+						raise
+					print("Warning: %s was not built, continuing without it. %s" % (name, e))
+					continue
+				print("%s was built." % name)
+				self.cache.record(name, digest)
+
+	def reportPackageSize(self, addon_filename):
+		"""パッケージ全体の大きさと、辞書から作ったファイルが占める大きさを報告する。"""
+		after = os.path.getsize(addon_filename)
+		parts = dict.fromkeys([name for name, path in PACKAGE_PARTS], 0)
+		with zipfile.ZipFile(addon_filename) as package:
+			for info in package.infolist():
+				for name, path in PACKAGE_PARTS:
+					if path in "/" + info.filename:
+						parts[name] += info.compress_size
+						break
+		print("Package size: %.1f KB" % (after / 1024))
+		for name, size in parts.items():
+			if size:
+				print("  %-24s %8.1f KB" % (name, size / 1024))
+		# 比べる基準は、辞書の JSON をそのまま zip で圧縮して含め、辞書から作ったファイルを含めないパッケージ。
+		# 辞書を圧縮した場合は、元の JSON を zip で圧縮した大きさで見積もる
+		baseline = after - sum(size for name, size in parts.items() if name != "converter dictionaries")
+		if self.compressedDictionaries is not None:
+			baseline += sum(info["deflatedBytes"] for info in self.compressedDictionaries.values())
+		print("Baseline with plain dictionaries only: %.1f KB (this package is %+.1f%%)" % (
+			baseline / 1024, (after - baseline) / baseline * 100,
+		))
+		if self.compressedDictionaries is not None and parts["dictionary shards"]:
+			print("Warning: the package contains both compressed dictionaries and dictionary shards.")
 
 	def makePackageInfo(self, archive_name, addon_filename, build_filename):
 		print("Calculating  hash...")
-		with open(archive_name, mode = "rb") as f:
-			content = f.read()
-		package_hash = hashlib.sha1(content).hexdigest()
-		with open(addon_filename, mode = "rb") as f:
-			content = f.read()
-		addon_hash = hashlib.sha1(content).hexdigest()
+		package_hash = build_cache.hashFile(archive_name)
+		addon_hash = build_cache.hashFile(addon_filename)
 		print("creating package info...")
 		info = {}
 		info["package_hash"] = package_hash
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# ビルドの手順ごとに入力の内容のハッシュを控え、変わっていない手順を飛ばす
+
+"""tools/build.py の手順ごとに、入力となるファイルの内容から求めたハッシュを .buildCache.json に控える。
+次のビルドで入力のハッシュが同じで、出力も残っていれば、その手順は飛ばしてよい。
+
+ファイルは一定の大きさずつ読んでハッシュを求めるので、大きなファイルでもメモリを使い過ぎない。
+また、ファイルごとの (更新日時, 大きさ) とハッシュも控えておき、どちらも変わっていなければ読み直さない。
+そのため、少しだけ変更した後のビルドでは、変更したファイルだけを読めば済む。
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+
+CACHE_FILE = ".buildCache.json"
+
+# 一度に読む大きさ
+CHUNK_SIZE = 1024 * 1024
+
+# 入力に含めないディレクトリとファイル
+IGNORED_DIRS = ("__pycache__", ".git")
+IGNORED_FILES = ("*.pyc", "*.log")
+
+
+def hashFile(path):
+	"""path の内容の sha1 を、CHUNK_SIZE ずつ読みながら求める。"""
+	digest = hashlib.sha1()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def listFiles(paths, ignored=()):
+	"""paths（ファイルかディレクトリ）に含まれるファイルを、並べ替えて返す。
+
+	ignored には、含めないファイルの、区切りを / にしたパスのパターンを渡す。
+	"""
+	files = []
+	for path in paths:
+		if os.path.isfile(path):
+			files.append(path)
+			continue
+		for current, dirs, names in os.walk(path):
+			dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+			for name in names:
+				if any(fnmatch.fnmatch(name, pattern) for pattern in IGNORED_FILES):
+					continue
+				file = os.path.join(current, name)
+				if any(fnmatch.fnmatch(file.replace(os.sep, "/"), pattern) for pattern in ignored):
+					continue
+				files.append(file)
+	return sorted(files)
+
+
+class BuildCache:
+	def __init__(self, path=CACHE_FILE):
+		self.path = path
+		try:
+			with open(path, encoding="utf-8") as f:
+				data = json.load(f)
+		except (FileNotFoundError, ValueError):
+			data = {}
+		# 手順の名前→入力のハッシュ
+		self._steps = data.get("steps", {})
+		# ファイルのパス→[更新日時, 大きさ, ハッシュ]
+		self._files = data.get("files", {})
+
+	def fileHash(self, path):
+		"""path の内容の sha1。更新日時と大きさが控えと同じなら、読まずに控えを返す。"""
+		stat = os.stat(path)
+		key = os.path.abspath(path)
+		cached = self._files.get(key)
+		if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+			return cached[2]
+		sha1 = hashFile(path)
+		self._files[key] = [stat.st_mtime_ns, stat.st_size, sha1]
+		return sha1
+
+	def digest(self, paths, ignored=(), extra=""):
+		"""paths に含まれるファイルのパスと内容から求めたハッシュ。
+
+		extra には、ファイル以外に結果を左右するもの（環境変数など）を文字列で渡す。
+		"""
+		digest = hashlib.sha1(extra.encode("utf-8"))
+		for file in listFiles(paths, ignored):
+			digest.update(("%s\0%s\0" % (file.replace(os.sep, "/"), self.fileHash(file))).encode("utf-8"))
+		return digest.hexdigest()
+
+	def isFresh(self, step, digest, outputs=()):
+		"""step の入力が前回と同じで、出力もすべて残っているか。"""
+		return self._steps.get(step) == digest and all(os.path.exists(output) for output in outputs)
+
+	def record(self, step, digest):
+		self._steps[step] = digest
+		self.save()
+
+	def save(self):
+		temp = self.path + ".tmp"
+		with open(temp, "w", encoding="utf-8") as f:
+			json.dump({"steps": self._steps, "files": self._files}, f, indent=1, sort_keys=True)
+		os.replace(temp, self.path)
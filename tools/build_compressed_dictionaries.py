@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# パッケージを小さくするため、辞書を xz で圧縮する
+
+"""englishToKanaConverter の辞書の JSON を xz で圧縮し、目録と一緒に
+addon/globalPlugins/ERE/_compressedDictionaries に書き出す。
+
+    python tools/build_compressed_dictionaries.py
+
+tools/build.py からも呼び出される。目録があれば、buildVars.py は元の JSON をパッケージから除き、
+実行時には compressedDictionaries が初回の起動時に展開する。
+
+圧縮する前に、変換器の dictionaries モジュールが、JSON をそのまま読み込んだ表だけを
+属性として持っていることを確かめる。ほかの属性があると、実行時に作る dictionaries モジュールでは
+代わりにならないので、圧縮せずに RuntimeError で止める。このとき tools/build.py は警告を出し、
+目録の無いまま、元の JSON をそのままパッケージに含める。
+"""
+
+import argparse
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import sys
+import types
+import zlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import buildVars
+from tools import nvda_stubs
+
+SOURCE_DIR = os.path.join(nvda_stubs.ADDON_DIR, "_englishToKanaConverter", "englishToKanaConverter", "dictionaries")
+
+# すべての辞書で同じ設定を使う
+PRESET = 9 | lzma.PRESET_EXTREME
+
+
+def verify(tables):
+	"""変換器の dictionaries モジュールが、tables（属性名→辞書）だけを持っていることを確かめる。"""
+	module = nvda_stubs.importAddonModule("_englishToKanaConverter.englishToKanaConverter.dictionaries")
+	for name, value in vars(module).items():
+		if name.startswith("_") or isinstance(value, types.ModuleType):
+			continue
+		if name not in tables:
+			raise RuntimeError("dictionaries.%s は JSON から読み込んだ表ではないため、辞書を圧縮できません。" % name)
+		if value != tables[name]:
+			raise RuntimeError("dictionaries.%s の内容が %s.json と一致しないため、辞書を圧縮できません。" % (name, name.lower()))
+
+
+def build(source=SOURCE_DIR, quiet=False):
+	"""辞書を圧縮し、ファイルごとの大きさを返す。"""
+	compressedDictionaries = nvda_stubs.importAddonModule("compressedDictionaries")
+	dest = compressedDictionaries.PAYLOAD_DIR
+	if os.path.isdir(dest):
+		shutil.rmtree(dest)
+	sources = {}
+	for name in sorted(compressedDictionaries.TARGETS):
+		path = os.path.join(source, "%s.json" % name)
+		if os.path.isfile(path):
+			with open(path, "rb") as f:
+				sources[name] = f.read()
+	if not sources:
+		raise RuntimeError("%s に辞書が見つかりません。git submodule update --init を実行してください。" % source)
+	# 確かめる前に書き出すと、失敗しても buildVars.py が元の JSON をパッケージから除いてしまう
+	verify({compressedDictionaries.TARGETS[name]: json.loads(data.decode("utf-8")) for name, data in sources.items()})
+	os.makedirs(dest)
+	files = {}
+	digest = hashlib.sha1()
+	for name, data in sources.items():
+		compressed = lzma.compress(data, preset=PRESET)
+		with open(os.path.join(dest, "%s.json%s" % (name, compressedDictionaries.EXTENSION)), "wb") as f:
+			f.write(compressed)
+		sha1 = hashlib.sha1(data).hexdigest()
+		digest.update(("%s\0%s\0" % (name, sha1)).encode("utf-8"))
+		files[name] = {
+			"sha1": sha1,
+			"bytes": len(data),
+			"compressedBytes": len(compressed),
+			# 圧縮せずにパッケージに含めた場合の大きさ。パッケージの zip と同じ既定の設定で求める
+			"deflatedBytes": len(zlib.compress(data)),
+		}
+		if not quiet:
+			print("  %-10s %8.1f KB -> %8.1f KB" % (name, len(data) / 1024, len(compressed) / 1024))
+	manifest = {
+		"version": buildVars.ADDON_VERSION,
+		# 展開先のディレクトリ名。版が同じでも辞書が変われば変わる
+		"key": "%s-%s" % (buildVars.ADDON_VERSION, digest.hexdigest()[:12]),
+		"files": files,
+	}
+	with open(os.path.join(dest, compressedDictionaries.MANIFEST_FILE), "w", encoding="utf-8") as f:
+		json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+	return files
+
+
+def main():
+	parser = argparse.ArgumentParser(description="パッケージを小さくするため、辞書を xz で圧縮する。")
+	parser.add_argument("--source", default=SOURCE_DIR, help="辞書の JSON を置いたディレクトリ")
+	args = parser.parse_args()
+	build(args.source)
+	return 0
+
+
+if __name__ == "__main__":
+	try:
+		sys.exit(main())
+	except RuntimeError as e:
+		print(e, file=sys.stderr)
+		sys.exit(1)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# 省メモリモード用に、辞書を頭文字ごとに分割する
+
+"""englishToKanaConverter の辞書のうち大きなものを、頭文字ごとのファイルに分割し、
+目録と一緒に addon/globalPlugins/ERE/_dictionaryShards に書き出す。
+
+    python tools/build_dictionary_shards.py
+
+tools/build.py からも呼び出される。省メモリモードでは、この目録と分割したファイルを使い、
+必要になった頭文字の分だけを読み込む。
+表ごとに、すべての見出し語の一覧も書き出す。読み間違いの報告ダイアログで近い見出し語を探すときに、
+分割を読み込まずに索引を作るために使う。
+
+辞書を圧縮した正式なビルドでは、buildVars.py がこれらをパッケージから除く。
+その場合は実行時に、dictionaryShards が展開した辞書から同じものを作る。
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+
+SOURCE_DIR = os.path.join(nvda_stubs.ADDON_DIR, "_englishToKanaConverter", "englishToKanaConverter", "dictionaries")
+
+
+def build(source=SOURCE_DIR, quiet=False):
+	dictionaryShards = nvda_stubs.importAddonModule("dictionaryShards")
+	tables = {}
+	for table in dictionaryShards.TABLES:
+		path = os.path.join(source, "%s.json" % table)
+		if not os.path.isfile(path):
+			raise RuntimeError("%s が見つかりません。git submodule update --init を実行してください。" % path)
+		with open(path, encoding="utf-8") as f:
+			tables[table] = json.load(f)
+	index = dictionaryShards.write(tables, dictionaryShards.SHARDS_DIR)
+	if not quiet:
+		for table, shards in index["tables"].items():
+			print("  %-10s %d件を %d 個に分割しました" % (table, sum(info["count"] for info in shards.values()), len(shards)))
+	return index
+
+
+def main():
+	parser = argparse.ArgumentParser(description="省メモリモード用に、辞書を頭文字ごとに分割する。")
+	parser.add_argument("--source", default=SOURCE_DIR, help="辞書の JSON を置いたディレクトリ")
+	args = parser.parse_args()
+	build(args.source)
+	return 0
+
+
+if __name__ == "__main__":
+	try:
+		sys.exit(main())
+	except RuntimeError as e:
+		print(e, file=sys.stderr)
+		sys.exit(1)
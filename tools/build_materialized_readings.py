@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# よく使われる単語を、ビルド時に変換しておく
+
+"""tools/frequent_words.txt のよく使われる単語を、通常のモード（ConversionMode.STANDARD）で変換し、
+文字列→読みの表として addon/globalPlugins/ERE/_materializedReadings.json に書き出す。
+
+    python tools/build_materialized_readings.py [--limit N]
+
+tools/build.py からも呼び出される。表には辞書と変換器の指紋を付けておき、
+実行時に指紋が合わない場合、materializedReadings はこの表を使わない。
+
+単語は、小文字のものと、先頭だけ大文字のものとの両方を変換しておく。
+表は省メモリモード以外では毎回の起動時に読み込むので、辞書の見出し語までは含めず、一覧の単語だけとする。
+強制スペルアウトモードは spellOut が変換表で変換するので、このモードの表は作らない。
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+
+FREQUENT_WORDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frequent_words.txt")
+
+# 変換しておく単語の数の上限。表は実行時にメモリに置くため、大きくしすぎないこと
+LIMIT = 3000
+
+_WORD = re.compile(r"[A-Za-z]+")
+
+
+def readFrequentWords(path=FREQUENT_WORDS):
+	words = []
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			line = line.strip()
+			if line and not line.startswith("#"):
+				words.append(line)
+	return words
+
+
+def collectWords(frequent, limit):
+	"""変換しておく単語を、よく使われる順に limit 語まで返す。"""
+	words = dict.fromkeys(word.lower() for word in frequent if _WORD.fullmatch(word))
+	return list(words)[:limit]
+
+
+def forms(word):
+	"""word について変換しておく形。小文字のものと、先頭だけ大文字のもの。"""
+	return (word, word.capitalize())
+
+
+def build(limit=LIMIT, quiet=False):
+	materializedReadings = nvda_stubs.importAddonModule("materializedReadings")
+	engine = nvda_stubs.importAddonModule("_englishToKanaConverter.englishToKanaConverter")
+	converterModule = nvda_stubs.importAddonModule("converter")
+	if not os.path.isdir(materializedReadings.CONVERTER_DIR):
+		raise RuntimeError("%s が見つかりません。git submodule update --init を実行してください。" % materializedReadings.CONVERTER_DIR)
+	words = collectWords(readFrequentWords(), limit)
+	# 実行時と同じ前処理を通すため、アドオンの Converter を使う。表はまだ読み込まれていないので引かれない
+	converter = converterModule.Converter()
+	mode = engine.ConversionMode.STANDARD
+	table = {}
+	for word in words:
+		for form in forms(word):
+			table[form] = converter.process(form, mode=mode)
+	readings = {mode.name: table}
+	if not quiet:
+		print("  %-10s %d件" % (mode.name, len(table)))
+	with open(materializedReadings.READINGS_FILE, "w", encoding="utf-8") as f:
+		json.dump(
+			{"fingerprint": materializedReadings.fingerprint(), "readings": readings},
+			f, ensure_ascii=False, separators=(",", ":"),
+		)
+	return readings
+
+
+def main():
+	parser = argparse.ArgumentParser(description="よく使われる単語を、ビルド時に変換しておく。")
+	parser.add_argument("--limit", type=int, default=LIMIT, help="変換しておく単語の数の上限")
+	args = parser.parse_args()
+	build(args.limit)
+	return 0
+
+
+if __name__ == "__main__":
+	try:
+		sys.exit(main())
+	except RuntimeError as e:
+		print(e, file=sys.stderr)
+		sys.exit(1)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# テキストファイルを、NVDA を使わずにカナへ変換する
+
+"""テキストファイル（省略時は標準入力）を、アドオンと同じ変換器でカナに変換して標準出力に書く。
+
+    python tools/convert_text.py [ファイル ...] [--spell-all] [--dictionaries DIR]
+
+Converter.process_iter で文ごとに変換して書き出すため、大きなファイルでも一定のメモリで、
+先頭から順に結果が出力される。
+"""
+
+import argparse
+import io
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+
+
+def main():
+	parser = argparse.ArgumentParser(description="テキストファイルを、アドオンと同じ変換器でカナに変換する。")
+	parser.add_argument("files", nargs="*", help="変換するファイル。省略時は標準入力")
+	parser.add_argument("--spell-all", action="store_true", help="すべての英単語をスペルアウトする")
+	parser.add_argument("--dictionaries", help="辞書の JSON を置いたディレクトリ。省略時は同梱の辞書を使う")
+	args = parser.parse_args()
+
+	converter = nvda_stubs.importAddonModule("converter")
+	if args.dictionaries:
+		nvda_stubs.loadDictionaries(args.dictionaries)
+	mode = converter.ConversionMode.SPELL_ALL if args.spell_all else converter.ConversionMode.STANDARD
+	engine = converter.get()
+	out = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="")
+	if args.files:
+		sources = [open(path, encoding="utf-8", newline="") for path in args.files]
+	else:
+		sources = [io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")]
+	for source in sources:
+		with source:
+			for converted in engine.process_iter(source, mode=mode):
+				out.write(converted)
+				out.flush()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+# 高速化のための処理が、変換結果を変えていないことを、ランダムな入力で確かめる
+
+"""英語・日本語・ソースコードの混ざった文字列をランダムに作り、元の変換器で変換した結果と、
+高速化のための処理を通した結果とを比べる。1件でも異なれば、異なる結果になる最小の入力まで縮めて表示し、
+終了コード 1 で終わる。あわせて、同じ入力に対する構成ごとの処理速度を、元の変換器との比で報告する。
+
+    python tools/fuzz_conversion.py [--count N] [--seed N] [--builtin builtin.dic] [--dictionaries DIR]
+
+元の変換器は、アドオンの Converter ではなく、EnglishToKanaConverter.process そのものとする。
+addressReader と（通常のモードでは）identifierSplitter の前処理は読み方を意図して変えるので、
+前処理が文字列を変える入力では、前処理の後の文字列を EnglishToKanaConverter.process に渡したものと比べる。
+前処理そのものは、prepare の構成で、元の文字列と比べて確かめる。
+materializedReadings の表も、比べる相手の Converter ではなく EnglishToKanaConverter で作る。比べる構成は次の通り。
+
+* identifierSplitter: SPLIT_CASES の決まった入力を、期待する分け方と比べる。略語の複数形を分けないことなど
+* prepare: Converter._prepare の前処理。URL などを含まない入力で、通常のモードでは空白を入れることと
+  _ を空白にすることのほかに文字列を変えていないこと、SPELL_ALL では何も変えていないことを確かめる
+* converter: Converter.process。materializedReadings の表（入力の単語から作る）を先に引く
+* process_many: Converter.process_many で、いくつかずつまとめて変換する
+* process_iter: Converter.process_iter で文ごとに変換し、つなげる。空白の無いまま bufferSize の2倍を
+  超える部分は、手元に置く量を抑えるため意図して途中で区切られるので、そうした入力は比べない
+* chunked: chunkedConversion.convert で、短く区切りながら変換する
+* prefetcher: prefetcher.Prefetcher と同じく、文ごとに別の Converter で変換して控えに入れ、get で取り出す
+* persistentCache: persistentCache.PersistentCache に入れてファイルに書き、別に作ったものに読み込ませて取り出す。
+  MAX_TEXT_LENGTH より長い入力は控えないので比べない
+* packedTables: 辞書をすべて packedTable.PackedTable にして変換する
+* spellOut: spellOut.convert の変換表で変換する。SPELL_ALL の場合だけ比べる
+* fusedSpeechDict: 変換結果に、組み込みの読み上げ辞書を postProcessor.FusedSpeechDict で適用する。
+  --builtin で NVDA の builtin.dic を指定した場合だけ比べる
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+
+JAPANESE = ["これは", "の", "を開く", "です。", "、", "ファイル名は", "設定", "エラー：", "「", "」", "（", "）", "について"]
+PUNCTUATION = [" ", " ", " ", ", ", ". ", "! ", "? ", "\n", ": ", "; ", "'", "\"", "(", ")", "-", "/"]
+MUTATIONS = ("insert", "delete", "replace", "swapcase", "splice")
+ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 _-./:@'\n"
+
+# identifierSplitter.split の入力と、期待する結果。文章に現れる略語の複数形は分けない
+SPLIT_CASES = {
+	"APIs": "APIs",
+	"URLs": "URLs",
+	"PDFs": "PDFs",
+	"CDs": "CDs",
+	"GPUs": "GPUs",
+	"FAQs": "FAQs",
+	"OSes": "OSes",
+	"IDs": "IDs",
+	"getIDs": "get IDs",
+	"parseURLs": "parse URLs",
+	"listAPIsFor": "list APIs For",
+	"HTTPServer": "HTTP Server",
+	"getHTTPResponse": "get HTTP Response",
+	"max_retry_count": "max retry count",
+}
+
+# 入力に混ぜる、略語の複数形
+PLURAL_ACRONYMS = [text for text, expected in SPLIT_CASES.items() if text == expected]
+
+# process_iter に渡す bufferSize。短くして、切れ目を探す処理を多く通す
+ITER_BUFFER_SIZE = 40
+
+
+class Generator:
+	"""辞書の見出し語に偏らせて、入力の文字列を作る。"""
+
+	def __init__(self, dictionaries, seed):
+		self.rng = random.Random(seed)
+		self.words = sorted(key for key in dictionaries.WORDS if key.isalpha())
+		self.phrases = sorted(dictionaries.PHRASES)
+		self.affixes = sorted(dictionaries.PREFIX) + sorted(dictionaries.SUFFIX)
+
+	def word(self):
+		rng = self.rng
+		if rng.random() < 0.03:
+			return rng.choice(PLURAL_ACRONYMS)
+		choice = rng.random()
+		if choice < 0.45 and self.phrases:
+			word = rng.choice(self.phrases)
+		elif choice < 0.75 and self.words:
+			word = rng.choice(self.words)
+		elif choice < 0.85 and self.affixes and self.words:
+			word = rng.choice(self.affixes) + rng.choice(self.words) if rng.random() < 0.5 else rng.choice(self.words) + rng.choice(self.affixes)
+		else:
+			word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for i in range(rng.randint(1, 12)))
+		return self.case(word)
+
+	def case(self, word):
+		choice = self.rng.random()
+		if choice < 0.5:
+			return word.lower()
+		if choice < 0.8:
+			return word.capitalize()
+		if choice < 0.9:
+			return word.upper()
+		return word
+
+	def code(self):
+		rng = self.rng
+		parts = [self.word().lower() for i in range(rng.randint(2, 4))]
+		style = rng.randrange(5)
+		if style == 0:
+			return parts[0] + "".join(part.capitalize() for part in parts[1:])
+		if style == 1:
+			return "_".join(parts)
+		if style == 2:
+			return parts[0].upper() + "".join(part.capitalize() for part in parts[1:])
+		if style == 3:
+			return "https://%s.com/%s?%s=%d" % (parts[0], "/".join(parts[1:]), parts[-1], rng.randint(0, 999))
+		return "C:\\%s\\%s.txt" % ("\\".join(parts[:-1]), parts[-1])
+
+	def text(self):
+		rng = self.rng
+		pieces = []
+		for i in range(rng.randint(1, 15)):
+			choice = rng.random()
+			if choice < 0.6:
+				pieces.append(self.word())
+			elif choice < 0.75:
+				pieces.append(rng.choice(JAPANESE))
+			elif choice < 0.85:
+				pieces.append(self.code())
+			else:
+				pieces.append(str(rng.randint(0, 10000)))
+			pieces.append(rng.choice(PUNCTUATION))
+		text = "".join(pieces).strip()
+		for i in range(rng.randint(0, 3)):
+			text = self.mutate(text)
+		return text
+
+	def mutate(self, text):
+		rng = self.rng
+		if not text:
+			return rng.choice(ALPHABET)
+		i = rng.randrange(len(text))
+		mutation = rng.choice(MUTATIONS)
+		if mutation == "insert":
+			return text[:i] + rng.choice(ALPHABET) + text[i:]
+		if mutation == "delete":
+			return text[:i] + text[i + 1:]
+		if mutation == "replace":
+			return text[:i] + rng.choice(ALPHABET) + text[i + 1:]
+		if mutation == "swapcase":
+			return text[:i] + text[i].swapcase() + text[i + 1:]
+		return text[:i] + rng.choice(PUNCTUATION + JAPANESE) + text[i:]
+
+
+def minimize(text, fails):
+	"""fails(text) が True のままになる、できるだけ短い text を返す（ddmin）。"""
+	granularity = 2
+	while len(text) >= 2:
+		size = max(1, len(text) // granularity)
+		reduced = False
+		for start in range(0, len(text), size):
+			candidate = text[:start] + text[start + size:]
+			if candidate and fails(candidate):
+				text = candidate
+				granularity = max(granularity - 1, 2)
+				reduced = True
+				break
+		if not reduced:
+			if size == 1:
+				break
+			granularity = min(granularity * 2, len(text))
+	return text
+
+
+class Harness:
+	def __init__(self, args):
+		self.ERE = nvda_stubs.importAddonPackage()
+		ERE = self.ERE
+		if args.dictionaries:
+			nvda_stubs.loadDictionaries(args.dictionaries)
+		self.dictionaries = ERE.dictionarySwitcher.dictionaries
+		self.engine = ERE.converter.EnglishToKanaConverter()
+		self.converter = ERE.converter.Converter()
+		self.modes = list(ERE.ConversionMode)
+		self.builtin = None
+		if args.builtin:
+			import speechDictHandler
+			builtin = speechDictHandler.SpeechDict()
+			builtin.load(args.builtin)
+			self.builtin = builtin
+		self.configurations = [
+			("prepare", self.runPrepare),
+			("converter", self.runConverter),
+			("process_many", self.runProcessMany),
+			("process_iter", self.runProcessIter),
+			("chunked", self.runChunked),
+			("prefetcher", self.runPrefetcher),
+			("persistentCache", self.runPersistentCache),
+			("packedTables", self.runPackedTables),
+			("spellOut", self.runSpellOut),
+		]
+		if self.builtin is not None:
+			self.configurations.append(("fusedSpeechDict", self.runFusedSpeechDict))
+
+	def reference(self, text, mode):
+		"""元の変換器の変換結果。前処理が文字列を変える場合は、前処理の後の文字列を変換する。"""
+		return self.engine.process(self.converter._prepare(text, mode), mode=mode)
+
+	def appliesTo(self, name, mode):
+		"""name の構成を、mode で比べるかどうか。"""
+		return name != "spellOut" or mode == self.ERE.ConversionMode.SPELL_ALL
+
+	def applies(self, name, text):
+		"""name の構成で、text の変換結果が元の変換器と一致するはずかどうか。"""
+		if name == "prepare":
+			return self.ERE.addressReader.search(text) is None
+		if name == "process_iter":
+			return all(len(run) <= ITER_BUFFER_SIZE * 2 for run in text.split())
+		if name == "persistentCache":
+			return len(text) <= self.ERE.persistentCache.MAX_TEXT_LENGTH
+		return True
+
+	def referenceFor(self, name, text, mode):
+		if name == "prepare":
+			return self.normalize(text, mode)
+		if name == "fusedSpeechDict":
+			return self.builtin.sub(self.reference(text, mode))
+		return self.reference(text, mode)
+
+	def normalize(self, text, mode):
+		"""通常のモードで identifierSplitter が意図して変える、空白と _ を取り除く。"""
+		if mode == self.ERE.ConversionMode.STANDARD:
+			return text.replace(" ", "").replace("_", "")
+		return text
+
+	def materialize(self, texts):
+		"""入力に含まれる単語から、tools/build_materialized_readings.py と同じ形の
+		materializedReadings の表を作り、読み込ませる。読みは、比べる相手の Converter ではなく元の変換器で作る。"""
+		from tools import build_materialized_readings
+		words = {word.lower() for text in texts for word in text.split() if word.isalpha() and word.isascii()}
+		readings = {
+			mode.name: {form: self.reference(form, mode) for word in sorted(words) for form in build_materialized_readings.forms(word)}
+			for mode in self.modes
+		}
+		materializedReadings = self.ERE.materializedReadings
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, "readings.json")
+			with open(path, "w", encoding="utf-8") as f:
+				json.dump({"fingerprint": materializedReadings.fingerprint(), "readings": readings}, f, ensure_ascii=False)
+			# 別のスレッドを使わずに、その場で読み込む
+			materializedReadings.readings._load(path)
+
+	def runPrepare(self, texts, mode):
+		return [self.normalize(self.converter._prepare(text, mode), mode) for text in texts]
+
+	def runConverter(self, texts, mode):
+		return [self.converter.process(text, mode=mode) for text in texts]
+
+	def runProcessMany(self, texts, mode):
+		results = []
+		for start in range(0, len(texts), 8):
+			results.extend(self.converter.process_many(texts[start:start + 8], mode=mode))
+		return results
+
+	def runProcessIter(self, texts, mode):
+		return ["".join(self.converter.process_iter(text, mode=mode, bufferSize=ITER_BUFFER_SIZE)) for text in texts]
+
+	def runChunked(self, texts, mode):
+		chunkedConversion = self.ERE.chunkedConversion
+		process = lambda chunk: self.converter.process(chunk, mode=mode)
+		return [chunkedConversion.convert(process, text, budget=float("inf"), size=40)[0] for text in texts]
+
+	def runPrefetcher(self, texts, mode):
+		prefetcher = self.ERE.prefetcher
+		cache = prefetcher.Prefetcher()
+		# 読み上げに使うものとは別の変換器で変換する
+		process = self.ERE.converter.Converter().process
+		results = []
+		for text in texts:
+			for item in prefetcher._sentences(text):
+				if not isinstance(item, str):
+					cache.cache.put(prefetcher.ConversionCache.makeKey(item[1], mode), process(item[1], mode=mode))
+			results.append(cache.get(text, mode))
+			cache.cache.clear()
+		return results
+
+	def runPersistentCache(self, texts, mode):
+		PersistentCache = self.ERE.persistentCache.PersistentCache
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, "cache.jsonl")
+			cache = self.startCache(PersistentCache(path, maxEntries=len(texts)))
+			for text in texts:
+				cache.put(text, mode, self.converter.process(text, mode=mode))
+			cache.stop()
+			# 書き込んだファイルを、次回の起動時と同じように別のものに読み込ませる
+			cache = self.startCache(PersistentCache(path, maxEntries=len(texts)))
+			try:
+				return [cache.get(text, mode) for text in texts]
+			finally:
+				cache.stop()
+
+	def startCache(self, cache):
+		cache.start()
+		while not cache._ready:
+			if not cache._thread.is_alive():
+				raise RuntimeError("%s を読み込めませんでした" % cache.path)
+			time.sleep(0.001)
+		return cache
+
+	def runPackedTables(self, texts, mode):
+		switcher = self.ERE.dictionarySwitcher
+		PackedTable = self.ERE.packedTable.PackedTable
+		original = {name: getattr(self.dictionaries, attribute) for name, attribute in switcher._TARGETS.items()}
+		switcher._apply({name: PackedTable(table) for name, table in original.items()})
+		try:
+			return [self.converter.process(text, mode=mode) for text in texts]
+		finally:
+			switcher._apply(original)
+
+	def runSpellOut(self, texts, mode):
+		return [self.ERE.spellOut.convert(text) for text in texts]
+
+	def runFusedSpeechDict(self, texts, mode):
+		postProcessor = self.ERE.postProcessor
+		fused = postProcessor.FusedSpeechDict(self.builtin)
+		converted = [self.converter.process(text, mode=mode) for text in texts]
+		with postProcessor.japanese():
+			return [fused.sub(text) for text in converted]
+
+	def check(self, name, run, texts, mode):
+		"""異なる結果になった入力を、縮めた形で返す。"""
+		failures = []
+		for text, result in zip(texts, run(texts, mode)):
+			if self.applies(name, text) and result != self.referenceFor(name, text, mode):
+				fails = lambda candidate: self.applies(name, candidate) and run([candidate], mode)[0] != self.referenceFor(name, candidate, mode)
+				failures.append(minimize(text, fails))
+		return failures
+
+	def checkSplits(self):
+		"""SPLIT_CASES のうち、期待と異なる結果になった (入力, 結果) の一覧を返す。"""
+		split = self.ERE.identifierSplitter.split
+		return [(text, split(text)) for text, expected in SPLIT_CASES.items() if split(text) != expected]
+
+	def throughput(self, run, texts, mode):
+		start = time.perf_counter()
+		run(texts, mode)
+		return time.perf_counter() - start
+
+
+def main():
+	parser = argparse.ArgumentParser(description="高速化のための処理が、変換結果を変えていないことを確かめる。")
+	parser.add_argument("--count", type=int, default=2000, help="作る入力の数")
+	parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+	parser.add_argument("--builtin", help="NVDA の speechDicts/builtin.dic のパス")
+	parser.add_argument("--dictionaries", help="辞書の JSON を置いたディレクトリ。省略時は同梱の辞書を使う")
+	args = parser.parse_args()
+
+	nvda_stubs.installPluginEnvironment()
+	harness = Harness(args)
+	generator = Generator(harness.dictionaries, args.seed)
+	texts = [generator.text() for i in range(args.count)]
+	harness.materialize(texts)
+
+	splits = harness.checkSplits()
+	failed = bool(splits)
+	print("■ identifierSplitter: %s" % ("一致" if not splits else "%d 件が不一致" % len(splits)))
+	for text, result in splits:
+		print("    入力: %r  期待: %r  結果: %r" % (text, SPLIT_CASES[text], result))
+	print("%d 件の入力で比べます (seed=%d)" % (len(texts), args.seed))
+	for mode in harness.modes:
+		referenceTime = harness.throughput(lambda texts, mode: [harness.reference(text, mode) for text in texts], texts, mode)
+		print("■ %s (元の変換器: %.1f ms)" % (mode.name, referenceTime * 1000))
+		prepared = sum(harness.converter._prepare(text, mode) != text for text in texts)
+		print("  前処理で文字列が変わる入力: %d 件" % prepared)
+		for name, run in harness.configurations:
+			if not harness.appliesTo(name, mode):
+				continue
+			elapsed = harness.throughput(run, texts, mode)
+			failures = harness.check(name, run, texts, mode)
+			failed = failed or bool(failures)
+			status = "一致" if not failures else "%d 件が不一致" % len(failures)
+			print("  %-16s %8.1f ms (%.2f 倍)  %s" % (name, elapsed * 1000, referenceTime / max(elapsed, 1e-9), status))
+			for text in sorted(set(failures), key=len)[:5]:
+				print("    入力: %r" % text)
+				print("      元の変換器: %r" % harness.referenceFor(name, text, mode))
+				print("      %s: %r" % (name, run([text], mode)[0]))
+	return 1 if failed else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# ベンチマークなどを NVDA の外で動かすための、NVDA のモジュールの代用品
+
+"""NVDA を起動せずにアドオンのモジュールを読み込めるよう、必要最小限の代用品を
+sys.modules に登録する。
+
+    from tools import nvda_stubs
+    nvda_stubs.install()
+
+動作を再現するのは、計測に関わる部分だけである。speechDictHandler は、
+NVDA の speechDicts/builtin.dic などを本物と同じ規則で読み込み、適用できる。
+
+GlobalPlugin まで含めて動かす場合は、installPluginEnvironment() で GUI や設定などの代用品も登録し、
+importAddonPackage() で globalPlugins.ERE を __init__.py ごと読み込む。
+"""
+
+import builtins
+import importlib
+import json
+import os
+import re
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_DIR = os.path.join(ROOT, "addon", "globalPlugins", "ERE")
+ADDON_PACKAGE = "globalPlugins.ERE"
+
+
+class _Log:
+	def _ignore(self, *args, **kwargs):
+		pass
+
+	debug = info = warning = debugWarning = error = exception = _ignore
+
+
+# speechDictHandler の EntryType に合わせる
+ENTRY_TYPE_ANYWHERE = 0
+ENTRY_TYPE_REGEXP = 1
+ENTRY_TYPE_WORD = 2
+
+
+class SpeechDictEntry:
+	def __init__(self, pattern, replacement, comment="", caseSensitive=True, type=ENTRY_TYPE_ANYWHERE):
+		self.pattern = pattern
+		flags = re.U
+		if not caseSensitive:
+			flags |= re.IGNORECASE
+		if type == ENTRY_TYPE_REGEXP:
+			tempPattern = pattern
+		elif type == ENTRY_TYPE_WORD:
+			tempPattern = r"\b" + re.escape(pattern) + r"\b"
+		else:
+			tempPattern = re.escape(pattern)
+		self.compiled = re.compile(tempPattern, flags)
+		self.replacement = replacement
+		self.comment = comment
+		self.caseSensitive = caseSensitive
+		self.type = type
+
+	def sub(self, text):
+		if self.type == ENTRY_TYPE_REGEXP:
+			replacement = self.replacement
+		else:
+			replacement = self.replacement.replace("\\", "\\\\")
+		return self.compiled.sub(replacement, text)
+
+
+class SpeechDict(list):
+	fileName = None
+
+	def load(self, fileName):
+		"""NVDA の読み上げ辞書ファイルを読み込む。"""
+		self.fileName = fileName
+		comment = ""
+		del self[:]
+		with open(fileName, encoding="utf-8-sig") as f:
+			for line in f:
+				line = line.rstrip("\r\n")
+				if line.isspace() or not line:
+					comment = ""
+					continue
+				if line.startswith("#"):
+					comment = line[1:].strip()
+					continue
+				fields = line.split("\t")
+				if len(fields) != 4:
+					continue
+				pattern, replacement, caseSensitive, entryType = fields
+				try:
+					self.append(SpeechDictEntry(pattern, replacement, comment, caseSensitive == "1", int(entryType)))
+				except re.error:
+					pass
+				comment = ""
+
+	def sub(self, text):
+		for entry in self:
+			text = entry.sub(text)
+		return text
+
+
+def _module(name, **attrs):
+	module = types.ModuleType(name)
+	module.__dict__.update(attrs)
+	sys.modules[name] = module
+	return module
+
+
+def install():
+	"""代用品を sys.modules に登録する。本物がすでに読み込まれていれば何もしない。"""
+	if "speechDictHandler" not in sys.modules:
+		_module(
+			"speechDictHandler",
+			SpeechDict=SpeechDict,
+			SpeechDictEntry=SpeechDictEntry,
+			dictionaries={"builtin": SpeechDict(), "default": SpeechDict(), "voice": SpeechDict(), "temp": SpeechDict()},
+		)
+	if "logHandler" not in sys.modules:
+		_module("logHandler", log=_Log())
+
+
+class _Stub:
+	"""GUI などの代用品。どの属性を取り出しても、呼び出しても、自分と同じ種類のものを返す。"""
+
+	def __init__(self, *args, **kwargs):
+		pass
+
+	def __getattr__(self, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
+		return _Stub()
+
+	def __call__(self, *args, **kwargs):
+		return _Stub()
+
+	def __or__(self, other):
+		return self
+
+	__ror__ = __or__
+
+
+class _ExtensionPoint:
+	"""speech.extensions の拡張ポイントの代用品。"""
+
+	def __init__(self):
+		self.handlers = []
+
+	def register(self, handler):
+		self.handlers.append(handler)
+
+	def unregister(self, handler):
+		if handler in self.handlers:
+			self.handlers.remove(handler)
+
+	def notify(self, **kwargs):
+		for handler in list(self.handlers):
+			handler(**kwargs)
+
+	def apply(self, value, **kwargs):
+		for handler in list(self.handlers):
+			value = handler(value, **kwargs)
+		return value
+
+
+_DEFAULT = re.compile(r"default=(\"[^\"]*\"|'[^']*'|[^,)]*)")
+
+
+def _specDefault(spec):
+	value = _DEFAULT.search(spec).group(1)
+	if value in ("True", "False"):
+		return value == "True"
+	if value[:1] in "\"'":
+		return value[1:-1]
+	return int(value)
+
+
+class _Config:
+	"""config の代用品。config.conf[セクション] は、spec の既定値で作る。"""
+
+	def __init__(self):
+		self.spec = {}
+		# セクションごとに、既定値から変える設定
+		self.overrides = {}
+		self._sections = {
+			"speech": {"autoLanguageSwitching": False, "symbolLevel": 100},
+		}
+
+	def __getitem__(self, section):
+		if section not in self._sections:
+			values = {key: _specDefault(value) for key, value in self.spec[section].items()}
+			values.update(self.overrides.get(section, {}))
+			self._sections[section] = values
+		return self._sections[section]
+
+
+class LangChangeCommand:
+	def __init__(self, lang):
+		self.lang = lang
+
+
+def _processText(locale, text, symbolLevel, **kwargs):
+	return text
+
+
+def installPluginEnvironment(configPath=None, settings=None):
+	"""GlobalPlugin を動かすのに必要な代用品も sys.modules に登録する。
+
+	configPath は NVDA の設定ディレクトリとして使うディレクトリ。省略時は一時ディレクトリを使う。
+	settings には、ERE_global の設定のうち、既定値から変えるものを渡す。
+	起動時の更新の確認は、ネットワークに接続しないよう、常に無効にする。
+	"""
+	install()
+	if "config" in sys.modules:
+		return
+	builtins.__dict__.setdefault("_", lambda text: text)
+	conf = _Config()
+	conf.overrides["ERE_global"] = dict(settings or {}, checkForUpdatesOnStartup=False)
+	_module("config", conf=conf, isAppX=False)
+	_module("languageHandler", getLanguage=lambda: "ja_JP")
+	_module(
+		"addonHandler",
+		initTranslation=lambda: None,
+		installAddonBundle=lambda bundle: None,
+		Addon=lambda path: types.SimpleNamespace(manifest={
+			"name": "EnglishReadingEnhancer", "summary": "English Reading Enhancer",
+			"version": "0.0.0", "docFileName": "readme.html",
+		}),
+	)
+	_module("globalVars", appArgs=types.SimpleNamespace(
+		secure=False, install=False, minimal=False,
+		configPath=configPath or tempfile.mkdtemp(prefix="ERE_config_"),
+	))
+	_module("globalPluginHandler", GlobalPlugin=type("GlobalPlugin", (), {"terminate": lambda self: None}))
+	_module("scriptHandler", script=lambda *args, **kwargs: (lambda func: func))
+	_module("textInfos", UNIT_READINGCHUNK="readingChunk")
+	_module("ui", message=lambda *args, **kwargs: None, browseableMessage=lambda *args, **kwargs: None)
+	_module("buildVersion", version_year=2025, version_major=1, version_minor=0)
+	_module("updateCheck", UpdateDownloader=_Stub)
+	if "winreg" not in sys.modules:
+		try:
+			import winreg  # noqa: F401
+		except ImportError:
+			_module("winreg")
+	_module("wx", __getattr__=lambda name: _Stub, ID_ANY=-1)
+	_module("gui", __getattr__=lambda name: _Stub(), mainFrame=_Stub(), message=_Stub())
+	extensions = _module(
+		"speech.extensions",
+		speechCanceled=_ExtensionPoint(),
+		filter_speechSequence=_ExtensionPoint(),
+	)
+	commands = _module("speech.commands", LangChangeCommand=LangChangeCommand)
+	inner = _module("speech.speech", processText=_processText, getCurrentLanguage=lambda: "ja_JP")
+	_module(
+		"speech", __path__=[], speech=inner, extensions=extensions, commands=commands,
+		LangChangeCommand=LangChangeCommand, processText=_processText,
+	)
+
+
+def importAddonPackage():
+	"""globalPlugins.ERE を、__init__.py も実行して読み込む。
+
+	先に installPluginEnvironment() を呼んでおくこと。
+	"""
+	if "globalPlugins" not in sys.modules:
+		_module("globalPlugins", __path__=[os.path.dirname(ADDON_DIR)])
+	return importlib.import_module(ADDON_PACKAGE)
+
+
+def importAddonModule(name):
+	"""アドオンのモジュールを読み込む。
+
+	globalPlugins.ERE の __init__.py は GUI などに依存するため実行せず、
+	パッケージだけを登録して、相対 import が通るようにする。
+	"""
+	install()
+	if ADDON_PACKAGE not in sys.modules:
+		parent = sys.modules.get("globalPlugins") or _module("globalPlugins", __path__=[os.path.dirname(ADDON_DIR)])
+		package = _module(ADDON_PACKAGE, __path__=[ADDON_DIR])
+		parent.ERE = package
+	return importlib.import_module("%s.%s" % (ADDON_PACKAGE, name))
+
+
+def loadDictionaries(directory):
+	"""directory にある phrases.json などで、englishToKanaConverter の辞書を差し替える。
+
+	dictionarySwitcher と同じく、存在するファイルの分だけを差し替える。差し替えた辞書の名前を返す。
+	"""
+	dictionarySwitcher = importAddonModule("dictionarySwitcher")
+	loaded = {}
+	for name in dictionarySwitcher._TARGETS:
+		path = os.path.join(directory, "%s.json" % name)
+		if os.path.isfile(path):
+			with open(path, encoding="utf-8") as f:
+				loaded[name] = json.load(f)
+	dictionarySwitcher._apply(loaded)
+	return sorted(loaded)
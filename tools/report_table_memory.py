@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# 辞書の表を、dict と packedTable.PackedTable とで持った場合のメモリと検索の速さを比べる
+
+"""既定の辞書と開発中の辞書のそれぞれについて、JSON を読み込んだ dict のままの場合と、
+packedTable.PackedTable にした場合とで、保持するメモリ（tracemalloc で計測）と、
+見つかる検索・見つからない検索の速さとを比べる。
+
+    python tools/report_table_memory.py [--default DIR] [--dev DIR]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import nvda_stubs
+
+DEFAULT_DIR = os.path.join(nvda_stubs.ADDON_DIR, "_englishToKanaConverter", "englishToKanaConverter", "dictionaries")
+DEV_DIR = os.path.join(nvda_stubs.ADDON_DIR, "_devDictionaries")
+NAMES = ("phrases", "words", "prefix", "suffix", "roman", "spell")
+
+
+def retained(build):
+	"""build() が返したものが保持しているメモリのバイト数と、返したもの。"""
+	gc.collect()
+	tracemalloc.start()
+	try:
+		value = build()
+		gc.collect()
+		size = tracemalloc.get_traced_memory()[0]
+	finally:
+		tracemalloc.stop()
+	return size, value
+
+
+def lookupTime(table, keys, number=20):
+	def run():
+		for key in keys:
+			key in table
+	return min(timeit.repeat(run, number=number, repeat=3)) / number / max(len(keys), 1)
+
+
+def measure(path, PackedTable):
+	with open(path, encoding="utf-8") as f:
+		text = f.read()
+	dictSize, plain = retained(lambda: json.loads(text))
+	source = json.loads(text)
+	packedSize, packed = retained(lambda: PackedTable(source))
+	del source
+	keys = list(plain)
+	sample = random.Random(0).sample(keys, min(1000, len(keys)))
+	misses = [key + "XQ" for key in sample]
+	return {
+		"entries": len(plain),
+		"utf8": len(text.encode("utf-8")),
+		"dict": dictSize,
+		"packed": packedSize,
+		"dictHit": lookupTime(plain, sample),
+		"packedHit": lookupTime(packed, sample),
+		"dictMiss": lookupTime(plain, misses),
+		"packedMiss": lookupTime(packed, misses),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description="辞書の表を dict と PackedTable とで持った場合を比べる。")
+	parser.add_argument("--default", default=DEFAULT_DIR, help="既定の辞書の JSON を置いたディレクトリ")
+	parser.add_argument("--dev", default=DEV_DIR, help="開発中の辞書の JSON を置いたディレクトリ")
+	args = parser.parse_args()
+	PackedTable = nvda_stubs.importAddonModule("packedTable").PackedTable
+
+	print("%-8s %-8s %7s %9s %9s %9s %7s %8s %8s %8s %8s" % (
+		"辞書", "表", "件数", "JSON", "dict", "Packed", "比率",
+		"dict命中", "P命中", "dict外れ", "P外れ",
+	))
+	for label, directory in (("default", args.default), ("dev", args.dev)):
+		for name in NAMES:
+			path = os.path.join(directory, "%s.json" % name)
+			if not os.path.isfile(path):
+				continue
+			r = measure(path, PackedTable)
+			print("%-8s %-8s %7d %8dK %8dK %8dK %6.1f%% %6.0fns %6.0fns %6.0fns %6.0fns" % (
+				label, name, r["entries"], r["utf8"] // 1024, r["dict"] // 1024, r["packed"] // 1024,
+				r["packed"] * 100.0 / max(r["dict"], 1),
+				r["dictHit"] * 1e9, r["packedHit"] * 1e9, r["dictMiss"] * 1e9, r["packedMiss"] * 1e9,
+			))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())